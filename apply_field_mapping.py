@@ -10,8 +10,6 @@ import sys
 import os
 from datetime import datetime
 from typing import Dict, List
-import PyPDF2
-from PyPDF2 import PdfReader, PdfWriter
 
 def load_mapping(mapping_file: str) -> Dict[str, str]:
     """Load the field name mapping from JSON file"""
@@ -30,6 +28,10 @@ def apply_mapping_to_pdf(pdf_path: str, mapping: Dict[str, str], output_path: st
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_path = f"{base_name}_mapped_{timestamp}.pdf"
     
+    # Loaded here so --help and argument errors stay fast
+    import PyPDF2
+    from PyPDF2 import PdfReader, PdfWriter
+    
     try:
         # Read the PDF
         reader = PdfReader(pdf_path)
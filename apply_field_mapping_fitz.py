@@ -10,7 +10,6 @@ import sys
 import os
 from datetime import datetime
 from typing import Dict, List
-import fitz  # PyMuPDF
 
 def load_mapping(mapping_file: str) -> Dict[str, str]:
     """Load the field name mapping from JSON file"""
@@ -29,6 +28,9 @@ def apply_mapping_to_pdf(pdf_path: str, mapping: Dict[str, str], output_path: st
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_path = f"{base_name}_mapped_{timestamp}.pdf"
     
+    # Loaded here so --help and argument errors stay fast
+    import fitz  # PyMuPDF
+    
     try:
         # Open the PDF
         doc = fitz.open(pdf_path)
@@ -5,16 +5,18 @@ Renames fields according to best practices without user interaction
 """
 
 import json
-import fitz  # PyMuPDF
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Tuple
+from pdf_session import PDFDocumentSession, PDFSource
 
 
 class AutoFieldRenamer:
-    def __init__(self, json_path: str, pdf_path: str):
+    def __init__(self, json_path: str, pdf_source: PDFSource, from_mmap: bool = False):
         self.json_path = json_path
-        self.pdf_path = pdf_path
+        # A path, an in-memory buffer or a binary file
+        self.session = PDFDocumentSession(pdf_source, from_mmap=from_mmap)
+        self.pdf_path = self.session.pdf_path
         self.fields_data = self.load_fields_data()
         self.renamed_fields = {}
         
@@ -216,11 +218,11 @@ class AutoFieldRenamer:
         # Create output path if not specified
         if output_path is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = Path(self.pdf_path).stem + f"_renamed_{timestamp}.pdf"
+            output_path = self.session.stem + f"_renamed_{timestamp}.pdf"
         
         try:
             # Open PDF
-            pdf_doc = fitz.open(self.pdf_path)
+            pdf_doc = self.session.fitz_doc
             
             # Track renamed fields
             renamed_count = 0
@@ -238,7 +240,6 @@ class AutoFieldRenamer:
             
             # Save the modified PDF
             pdf_doc.save(output_path)
-            pdf_doc.close()
             
             print(f"\n✓ Successfully renamed {renamed_count} fields in PDF")
             print(f"✓ Saved to: {output_path}")
@@ -248,6 +249,10 @@ class AutoFieldRenamer:
         except Exception as e:
             print(f"\nError applying renames: {e}")
             return False
+        
+        finally:
+            # Renames are applied to a fresh copy of the document each time
+            self.session.close()
     
     def update_json_file(self, output_path: str = None):
         """Update the JSON file with new field names"""
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Batch Field Extraction
+Extracts fields from every PDF in a directory or glob using a persistent worker pool
+and writes a manifest of timings, field counts and failures.
+With --scan, only inventories each PDF's AcroForm for intake triage.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import re
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+
+def find_pdfs(inputs: List[str]) -> List[str]:
+    """Expand directories and glob patterns into a sorted, de-duplicated list of PDFs"""
+    pdf_files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, '*.pdf')) + glob.glob(os.path.join(item, '*.PDF'))
+        else:
+            matches = glob.glob(item, recursive=True)
+        pdf_files.extend(m for m in matches if m.lower().endswith('.pdf') and os.path.isfile(m))
+    return sorted(set(pdf_files))
+
+
+def plan_outputs(pdf_files: List[str], output_dir: str, output_format: str) -> Dict[str, str]:
+    """Map each PDF to a unique output path inside the output directory"""
+    outputs = {}
+    used = set()
+    for pdf_path in pdf_files:
+        stem = Path(pdf_path).stem
+        candidate = f"{stem}_fields_enhanced.{output_format}"
+        counter = 2
+        while candidate in used:
+            candidate = f"{stem}_{counter}_fields_enhanced.{output_format}"
+            counter += 1
+        used.add(candidate)
+        outputs[pdf_path] = os.path.join(output_dir, candidate)
+    return outputs
+
+
+def extract_one(pdf_path: str, output_path: str, options: Dict) -> Dict:
+    """
+    Worker task: extract one PDF and write its output
+
+    Never raises; failures are reported in the returned manifest entry.
+    """
+    from extract_pdf_fields_enhanced import EnhancedPDFFieldExtractor
+    from extraction_cache import ExtractionCache
+
+    entry = {
+        'pdf': pdf_path,
+        'output': output_path,
+        'status': 'ok',
+        'fields': 0,
+        'widgets': 0,
+        'seconds': 0.0,
+        'cache_hit': False,
+        'error': None
+    }
+    start = time.perf_counter()
+    log = io.StringIO()
+
+    try:
+        # Keep per-field progress output out of the batch log
+        with contextlib.redirect_stdout(log):
+            extractor = EnhancedPDFFieldExtractor(pdf_path, text_engine=options['text_engine'],
+                                                  collect_geometry=options['geometry'],
+                                                  cache_dir=options['cache_dir'], cache_glyphs=not options['no_cache'])
+
+            if options['no_cache']:
+                cache = None
+                records = extractor.iter_fields_with_context()
+            else:
+                cache = ExtractionCache(options['cache_dir'])
+                records = extractor.iter_fields_cached(cache)
+                entry['cache_hit'] = extractor.loaded_from_cache
+
+            # Records are per widget; fields are counted by distinct name, as with --scan
+            field_names = set()
+
+            def tally(records):
+                for record in records:
+                    field_names.add(record['field_name'])
+                    yield record
+
+            if options['format'] == 'jsonl':
+                entry['widgets'] = extractor.save_results_jsonl(tally(records), output_path)
+                if entry['widgets'] and options['geometry']:
+                    with open(output_path, 'r', encoding='utf-8') as f:
+                        extractor.save_geometry(output_path, [json.loads(line) for line in f], cache)
+            else:
+                results = list(tally(records))
+                if results:
+                    extractor.save_results(results, output_path)
+                    if options['geometry']:
+                        extractor.save_geometry(output_path, results, cache)
+                entry['widgets'] = len(results)
+            entry['fields'] = len(field_names)
+
+        # The extractor reports recoverable errors on stdout rather than raising
+        errors = [line for line in log.getvalue().splitlines() if line.startswith('Error')]
+        if errors:
+            entry['error'] = '; '.join(errors)
+
+        if entry['widgets'] == 0:
+            entry['status'] = 'failed' if errors else 'empty'
+
+    except Exception as e:
+        entry['status'] = 'failed'
+        entry['error'] = f"{type(e).__name__}: {e}"
+        entry['traceback'] = traceback.format_exc()
+
+    entry['seconds'] = round(time.perf_counter() - start, 4)
+    return entry
+
+
+def crashed_entry(pdf_path: str, output_path: str) -> Dict:
+    """Manifest entry for a PDF whose worker process died"""
+    return {
+        'pdf': pdf_path,
+        'output': output_path,
+        'status': 'failed',
+        'fields': 0,
+        'widgets': 0,
+        'seconds': 0.0,
+        'cache_hit': False,
+        'error': 'Worker process crashed'
+    }
+
+
+def run_batch(pdf_files: List[str], output_dir: str, options: Dict, workers: int) -> List[Dict]:
+    """Extract every PDF in a shared process pool, isolating crashes to the PDF that caused them"""
+    outputs = plan_outputs(pdf_files, output_dir, options['format'])
+    entries = {}
+    crashed = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(extract_one, pdf_path, outputs[pdf_path], options): pdf_path
+            for pdf_path in pdf_files
+        }
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            try:
+                entry = future.result()
+            except BrokenProcessPool:
+                # The pool is unusable; re-run these PDFs one at a time below
+                crashed.append(pdf_path)
+                continue
+            entries[pdf_path] = entry
+            print(f"[{len(entries)}/{len(pdf_files)}] {entry['status']:>6} {entry['fields']:>5} fields "
+                  f"{entry['widgets']:>5} widgets {entry['seconds']:>8.2f}s  {pdf_path}")
+
+    # A crashed worker breaks every pending task, so retry each in its own process
+    for pdf_path in crashed:
+        try:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                entry = pool.submit(extract_one, pdf_path, outputs[pdf_path], options).result()
+        except BrokenProcessPool:
+            entry = crashed_entry(pdf_path, outputs[pdf_path])
+        entries[pdf_path] = entry
+        print(f"[{len(entries)}/{len(pdf_files)}] {entry['status']:>6} {entry['fields']:>5} fields "
+              f"{entry['widgets']:>5} widgets {entry['seconds']:>8.2f}s  {pdf_path}")
+
+    return [entries[pdf_path] for pdf_path in pdf_files]
+
+
+def scan_acroform(pdf_path: str) -> Dict:
+    """
+    Inventory a PDF's form fields from the AcroForm /Fields tree alone
+
+    Only the catalog, the page count and the field dictionaries are read;
+    pages, text and widget appearances are never loaded. Never raises.
+    """
+    import fitz  # PyMuPDF
+    from extract_pdf_fields_enhanced import EnhancedPDFFieldExtractor
+
+    entry = {
+        'pdf': pdf_path,
+        'pages': 0,
+        'acroform': False,
+        'fields': 0,
+        'widgets': 0,
+        'types': {},
+        'error': None
+    }
+
+    try:
+        with fitz.open(pdf_path) as doc:
+            entry['pages'] = doc.page_count
+            if not doc.is_pdf:
+                return entry
+
+            catalog = doc.pdf_catalog()
+            if doc.xref_get_key(catalog, 'AcroForm')[0] == 'null':
+                return entry
+            entry['acroform'] = True
+
+            def refs(xref, key):
+                kind, value = doc.xref_get_key(xref, key)
+                if kind == 'xref':
+                    # An indirect array: read the array object itself
+                    value = doc.xref_object(int(value.split()[0]), compressed=True)
+                elif kind != 'array':
+                    return []
+                return [int(number) for number in re.findall(r'(\d+) \d+ R', value)]
+
+            def value_of(xref, key):
+                kind, value = doc.xref_get_key(xref, key)
+                return None if kind == 'null' else value
+
+            field_types = {}
+            seen = set()
+            # (field xref, parent name, inherited /FT, inherited /Ff)
+            stack = [(xref, '', None, 0) for xref in reversed(refs(catalog, 'AcroForm/Fields'))]
+            while stack:
+                xref, parent_name, ft, flags = stack.pop()
+                if xref in seen:
+                    continue
+                seen.add(xref)
+
+                partial_name = value_of(xref, 'T')
+                name = f"{parent_name}.{partial_name}" if parent_name and partial_name else (partial_name or parent_name)
+                ft = value_of(xref, 'FT') or ft
+                own_flags = value_of(xref, 'Ff')
+                flags = int(own_flags) if own_flags is not None else flags
+
+                # Kids with a /T are child fields; kids without one are this field's widgets
+                widgets = 0
+                kids = refs(xref, 'Kids')
+                for kid in reversed(kids):
+                    if value_of(kid, 'T') is not None:
+                        stack.append((kid, name, ft, flags))
+                    else:
+                        widgets += 1
+                if not kids:
+                    widgets = 1
+
+                if widgets:
+                    entry['widgets'] += widgets
+                    field_types.setdefault(name, EnhancedPDFFieldExtractor.field_type_name(ft, flags) or 'Unknown')
+
+            entry['fields'] = len(field_types)
+            for field_type in field_types.values():
+                entry['types'][field_type] = entry['types'].get(field_type, 0) + 1
+
+    except Exception as e:
+        entry['error'] = f"{type(e).__name__}: {e}"
+
+    return entry
+
+
+def scan_summary(entry: Dict) -> str:
+    """One-line triage summary of a scan_acroform() entry"""
+    if entry['error']:
+        return f"{entry['pdf']}: error {entry['error']}"
+    if not entry['acroform']:
+        return f"{entry['pdf']}: {entry['pages']} pages, no AcroForm"
+
+    types = ', '.join(f"{name} {count}" for name, count in sorted(entry['types'].items(), key=lambda t: (-t[1], t[0])))
+    summary = f"{entry['pdf']}: {entry['pages']} pages, {entry['fields']} fields, {entry['widgets']} widgets"
+    return summary + (f" ({types})" if types else '')
+
+
+def run_scan(pdf_files: List[str], workers: int) -> List[Dict]:
+    """Scan every PDF, in input order, printing one summary line per PDF"""
+    entries = []
+    if workers <= 1:
+        results = map(scan_acroform, pdf_files)
+        for entry in results:
+            print(scan_summary(entry))
+            entries.append(entry)
+        return entries
+
+    # Scans take milliseconds, so hand them to workers in chunks
+    chunksize = max(1, min(64, len(pdf_files) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for entry in pool.map(scan_acroform, pdf_files, chunksize=chunksize):
+            print(scan_summary(entry))
+            entries.append(entry)
+    return entries
+
+
+def write_manifest(entries: List[Dict], manifest_path: str, inputs: List[str], output_dir: str,
+                   wall_seconds: float):
+    """Write the batch manifest with per-PDF entries and totals"""
+    manifest = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'inputs': inputs,
+        'output_dir': output_dir,
+        'totals': {
+            'pdfs': len(entries),
+            'succeeded': sum(1 for e in entries if e['status'] == 'ok'),
+            'empty': sum(1 for e in entries if e['status'] == 'empty'),
+            'failed': sum(1 for e in entries if e['status'] == 'failed'),
+            'cache_hits': sum(1 for e in entries if e['cache_hit']),
+            'fields': sum(e['fields'] for e in entries),
+            'widgets': sum(e['widgets'] for e in entries),
+            'wall_seconds': round(wall_seconds, 4)
+        },
+        'files': entries
+    }
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract fields from many PDFs with a worker pool')
+    parser.add_argument('inputs', nargs='+', help='PDF directories or glob patterns (e.g. "forms/**/*.pdf")')
+    parser.add_argument('-o', '--output-dir', default='extracted-fields', help='Directory for output files')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes (default: CPU count)')
+    parser.add_argument('--text-engine', choices=['pdfplumber', 'fitz'], default='pdfplumber',
+                        help='Word box source for context extraction (default: pdfplumber)')
+    parser.add_argument('--format', choices=['json', 'jsonl'], default='json', help='Output format')
+    parser.add_argument('--no-geometry', action='store_true', help='Do not write page geometry sidecars')
+    parser.add_argument('--no-cache', action='store_true', help='Always re-extract, bypassing the result cache')
+    parser.add_argument('--cache-dir', help='Result cache directory')
+    parser.add_argument('--manifest', help='Manifest path (default: <output_dir>/extraction_manifest.json)')
+    parser.add_argument('--scan', action='store_true',
+                        help='Only print page, field and field type counts per PDF from the AcroForm, '
+                             'without extracting anything')
+
+    args = parser.parse_args()
+
+    pdf_files = find_pdfs(args.inputs)
+    if not pdf_files:
+        print("No PDF files found")
+        return
+
+    if args.scan:
+        start = time.perf_counter()
+        entries = run_scan(pdf_files, max(1, min(args.workers, len(pdf_files))))
+        elapsed = time.perf_counter() - start
+
+        print("\n" + "=" * 50)
+        print(f"Scanned {len(entries)} PDF(s) in {elapsed:.2f}s: "
+              f"{sum(1 for e in entries if e['acroform'])} with an AcroForm, "
+              f"{sum(e['fields'] for e in entries)} fields, "
+              f"{sum(1 for e in entries if e['error'])} errors")
+
+        # Only written when asked for, so a scan leaves no files behind by default
+        if args.manifest:
+            with open(args.manifest, 'w', encoding='utf-8') as f:
+                json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'inputs': args.inputs,
+                           'files': entries}, f, indent=2, ensure_ascii=False)
+            print(f"Scan results saved to: {args.manifest}")
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.output_dir, 'extraction_manifest.json')
+
+    options = {
+        'text_engine': args.text_engine,
+        'format': args.format,
+        'no_cache': args.no_cache,
+        'cache_dir': args.cache_dir,
+        'geometry': not args.no_geometry
+    }
+
+    workers = max(1, min(args.workers, len(pdf_files)))
+    print(f"Extracting {len(pdf_files)} PDF(s) with {workers} worker(s)")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    entries = run_batch(pdf_files, args.output_dir, options, workers)
+    manifest = write_manifest(entries, manifest_path, args.inputs, args.output_dir,
+                              time.perf_counter() - start)
+
+    totals = manifest['totals']
+    print("\n" + "=" * 50)
+    print("BATCH EXTRACTION SUMMARY")
+    print("=" * 50)
+    print(f"PDFs: {totals['pdfs']}  succeeded: {totals['succeeded']}  empty: {totals['empty']}  "
+          f"failed: {totals['failed']}  cache hits: {totals['cache_hits']}")
+    print(f"Fields: {totals['fields']}  widgets: {totals['widgets']}  wall time: {totals['wall_seconds']:.2f}s")
+
+    failed = [e for e in entries if e['status'] == 'failed']
+    if failed:
+        print("\nFailed to extract:")
+        for entry in failed:
+            print(f"  ✗ {entry['pdf']}: {entry['error']}")
+
+    print(f"\nManifest saved to: {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
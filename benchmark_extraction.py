@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Extraction Benchmarks
+Measures the hot paths of extract_pdf_fields_enhanced.py on synthetic pages
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+from extract_pdf_fields_enhanced import EnhancedPDFFieldExtractor, FieldRecord, PageTextIndex
+
+
+# CLI invocations timed by the startup benchmark (scripts without argparse print usage when run bare)
+STARTUP_COMMANDS = [
+    ['extract_pdf_fields_enhanced.py', '--help'],
+    ['extract_pdf_fields.py', '--help'],
+    ['batch_extract_fields.py', '--help'],
+    ['auto_rename_fields.py', '--help'],
+    ['rename_pdf_fields.py', '--help'],
+    ['apply_field_mapping.py'],
+    ['apply_field_mapping_fitz.py'],
+    ['pdf_visual_context.py']
+]
+
+# Libraries that should only load on the code path that needs them
+HEAVY_MODULES = ('fitz', 'pymupdf', 'PyPDF2', 'pdfplumber', 'numpy')
+
+
+def make_dense_page(word_count: int, page_width: float = 612, page_height: float = 792,
+                    seed: int = 0) -> List[Dict]:
+    """Build word boxes resembling a page of dense legal text"""
+    rng = random.Random(seed)
+    words = []
+    x, y = 36.0, 36.0
+    while len(words) < word_count:
+        width = rng.uniform(8, 60)
+        if x + width > page_width - 36:
+            x = 36.0
+            y += 11.0
+            if y > page_height - 36:
+                y = 36.0 + rng.uniform(0, 5)
+        words.append({
+            'text': f"w{len(words)}",
+            'x0': x,
+            'y0': y,
+            'x1': x + width,
+            'y1': y + 9.0,
+            'fontname': 'Helvetica',
+            'size': 9
+        })
+        x += width + rng.uniform(2, 5)
+    return words
+
+
+def make_field_rects(field_count: int, page_width: float = 612, page_height: float = 792,
+                     seed: int = 1) -> List[List[float]]:
+    """Build field rectangles scattered across the page"""
+    rng = random.Random(seed)
+    rects = []
+    for _ in range(field_count):
+        x0 = rng.uniform(36, page_width - 200)
+        y0 = rng.uniform(36, page_height - 60)
+        rects.append([x0, y0, x0 + rng.uniform(10, 180), y0 + rng.choice([10, 14, 40])])
+    return rects
+
+
+def benchmark_context_index(field_counts: List[int], word_count: int):
+    """Compare a full page scan against the grid index and the NumPy batch path"""
+    extractor = EnhancedPDFFieldExtractor('benchmark.pdf')
+    page_text = make_dense_page(word_count)
+
+    print(f"Directional context: {word_count} words per page")
+    print(f"{'fields':>8} {'full scan (s)':>14} {'grid index (s)':>15} {'batch (s)':>10} {'speedup':>8}")
+
+    for field_count in field_counts:
+        rects = make_field_rects(field_count)
+
+        start = time.perf_counter()
+        expected = [extractor.extract_directional_context(rect, page_text) for rect in rects]
+        scan_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        text_index = PageTextIndex(page_text)
+        indexed = [extractor.extract_directional_context(rect, page_text, text_index) for rect in rects]
+        index_time = time.perf_counter() - start
+
+        if indexed != expected:
+            raise AssertionError(f"Grid index context differs from full scan at {field_count} fields")
+
+        start = time.perf_counter()
+        batched = extractor.compute_page_contexts(rects, page_text)
+        batch_time = time.perf_counter() - start
+
+        if batched != expected:
+            raise AssertionError(f"Batch context differs from full scan at {field_count} fields")
+
+        print(f"{field_count:>8} {scan_time:>14.4f} {index_time:>15.4f} {batch_time:>10.4f} "
+              f"{scan_time / min(index_time, batch_time):>7.1f}x")
+
+
+def benchmark_field_records(record_count: int):
+    """Compare memory held by per-field dicts against slotted FieldRecords"""
+    rects = make_field_rects(record_count)
+
+    def measure(build):
+        tracemalloc.start()
+        records = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del records
+        return current
+
+    dict_bytes = measure(lambda: [{
+        'name': f"field_{i}",
+        'type': 'Text',
+        'value': '',
+        'page': i % 12,
+        'rect': list(rect)
+    } for i, rect in enumerate(rects)])
+
+    record_bytes = measure(lambda: [FieldRecord(
+        name=f"field_{i}",
+        type='Text',
+        value='',
+        page=i % 12,
+        rect=tuple(rect),
+        options=None,
+        button_rects=None,
+        widget_index=0,
+        widget_count=1
+    ) for i, rect in enumerate(rects)])
+
+    print(f"\nField records: {record_count} fields")
+    print(f"{'dicts':>14}: {dict_bytes / 1024:>10.1f} KiB")
+    print(f"{'FieldRecord':>14}: {record_bytes / 1024:>10.1f} KiB ({record_bytes / dict_bytes:.0%} of dicts)")
+
+
+def make_checkbox_form(widget_count: int, pages: int = 10) -> bytes:
+    """Synthetic form PDF of mostly checkboxes with a text field on every row"""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    per_page = -(-widget_count // pages)
+    for page_num in range(pages):
+        page = doc.new_page(width=612, height=792)
+        for i in range(min(per_page, widget_count - page_num * per_page)):
+            row, column = divmod(i, 8)
+            widget = fitz.Widget()
+            widget.field_name = f"p{page_num}_w{i}"
+            if column == 7:
+                widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+                widget.rect = fitz.Rect(420, 30 + row * 14, 590, 42 + row * 14)
+            else:
+                widget.field_type = fitz.PDF_WIDGET_TYPE_CHECKBOX
+                widget.field_value = (i % 3 == 0)
+                widget.rect = fitz.Rect(30 + column * 50, 30 + row * 14, 40 + column * 50, 40 + row * 14)
+            page.add_widget(widget)
+    return doc.tobytes()
+
+
+def benchmark_widget_scanners(widget_count: int, repeats: int = 3):
+    """Compare page.widgets() against reading widget dictionaries by xref"""
+    pdf_bytes = make_checkbox_form(widget_count)
+    empty_context = {'left': '', 'right': '', 'above': '', 'below': ''}
+
+    print(f"\nWidget scan: {widget_count} widgets on 10 pages, best of {repeats} runs")
+    timings = {}
+    results = {}
+    for scanner in EnhancedPDFFieldExtractor.WIDGET_SCANNERS:
+        best = None
+        for _ in range(repeats):
+            # A fresh document each run so no widget state is cached
+            with EnhancedPDFFieldExtractor(pdf_bytes, widget_scanner=scanner) as extractor:
+                extractor.session.fitz_doc
+                start = time.perf_counter()
+                fields = extractor.extract_form_fields_with_pymupdf()
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[scanner] = best
+        results[scanner] = [record.to_result(empty_context) for records in fields.values() for record in records]
+
+    if results['xref'] != results['widgets']:
+        raise AssertionError("xref widget scanner records differ from page.widgets()")
+
+    for scanner, seconds in timings.items():
+        print(f"{scanner:>14}: {seconds:>8.4f}s ({timings['widgets'] / seconds:.1f}x)")
+
+
+def benchmark_startup(repeats: int):
+    """Time cold start of each CLI and report which heavy libraries it imports"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    print(f"\nCLI startup: best of {repeats} runs")
+    print(f"{'command':<42} {'wall (ms)':>10} {'imports (ms)':>13}  heavy modules")
+
+    for command in STARTUP_COMMANDS:
+        argv = [sys.executable] + command
+        wall_times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(argv, cwd=script_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            wall_times.append(time.perf_counter() - start)
+
+        # One extra run with -X importtime to see what was imported
+        profile = subprocess.run([sys.executable, '-X', 'importtime'] + command, cwd=script_dir,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        import_us = 0
+        heavy = set()
+        for line in profile.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, _, name = line[len('import time:'):].split('|')
+            import_us += int(self_us)
+            if name.strip() in HEAVY_MODULES:
+                heavy.add(name.strip())
+
+        print(f"{' '.join(command):<42} {min(wall_times) * 1000:>10.1f} {import_us / 1000:>13.1f}  "
+              f"{', '.join(sorted(heavy)) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark field extraction hot paths')
+    parser.add_argument('--fields', type=int, nargs='+', default=[50, 100, 300, 1000, 3000],
+                        help='Field counts to benchmark')
+    parser.add_argument('--words', type=int, default=3000, help='Words per synthetic page')
+    parser.add_argument('--records', type=int, default=100000, help='Field records for the memory benchmark')
+    parser.add_argument('--widgets', type=int, default=2000, help='Widgets in the synthetic form for the scanner benchmark')
+    parser.add_argument('--startup-repeats', type=int, default=5,
+                        help='Runs per CLI for the startup benchmark (0 to skip)')
+
+    args = parser.parse_args()
+
+    benchmark_context_index(args.fields, args.words)
+    benchmark_field_records(args.records)
+    benchmark_widget_scanners(args.widgets)
+    if args.startup_repeats > 0:
+        benchmark_startup(args.startup_repeats)
+
+
+if __name__ == "__main__":
+    main()
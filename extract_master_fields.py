@@ -48,8 +48,10 @@ def extract_master_fields():
     for field in master_fields:
         field_name = field.get('field_name', '')
         
-        # Extract feature name
-        if 'master_bath_' in field_name:
+        # Extract feature name, preferring the row header from table detection (--tables)
+        if field.get('table_row_label'):
+            feature = field['table_row_label']
+        elif 'master_bath_' in field_name:
             feature = field_name.replace('master_bath_', '').replace('_move_in_comments', '').replace('_landlords_move_out_comments', '')
         elif 'master_' in field_name:
             feature = field_name.replace('master_', '').replace('_move_in_comments', '').replace('_landlords_move_out_comments', '')
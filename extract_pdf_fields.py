@@ -4,22 +4,102 @@ PDF Field Extractor
 Extracts fillable text fields from PDFs along with surrounding context
 """
 
-import PyPDF2
-import pdfplumber
 from typing import Dict, List, Tuple, Optional
 import argparse
 import json
 import re
 from pathlib import Path
+from pdf_session import PDFDocumentSession
+
+
+def build_widget_locations(pdf_reader) -> Dict[str, List[Tuple[Optional[int], Optional[List[float]]]]]:
+    """
+    Map each field name, keyed like PyPDF2's get_fields(), to the page index and
+    rect of every widget it owns, including widgets found through /Kids.
+    
+    Pages come from one object-number -> page-index map built per document,
+    using a widget's /P entry or, failing that, the page whose /Annots lists it,
+    so resolution is linear in fields plus pages. Rects are converted to
+    top-left page coordinates, matching pdfplumber and PyMuPDF.
+    """
+    page_index = {}
+    annot_pages = {}
+    page_boxes = []
+    
+    for i, page in enumerate(pdf_reader.pages):
+        page_ref = page.indirect_reference
+        if page_ref is not None:
+            page_index[page_ref.idnum] = i
+        
+        mediabox = page.mediabox
+        page_boxes.append((float(mediabox.left), float(mediabox.top)))
+        
+        annots = page.get('/Annots')
+        if annots is not None:
+            for annot_ref in annots.get_object():
+                if hasattr(annot_ref, 'idnum'):
+                    annot_pages[annot_ref.idnum] = i
+    
+    locations = {}
+    root = pdf_reader.trailer['/Root']
+    if '/AcroForm' not in root:
+        return locations
+    
+    acro_form = root['/AcroForm'].get_object()
+    top_level = acro_form.get('/Fields')
+    if top_level is None:
+        return locations
+    
+    # Depth-first walk in document order; unnamed kids are widgets of their parent
+    stack = [(ref, None) for ref in reversed(top_level.get_object())]
+    visited = set()
+    while stack:
+        ref, owner = stack.pop()
+        idnum = getattr(ref, 'idnum', None)
+        if idnum is not None:
+            if idnum in visited:
+                continue
+            visited.add(idnum)
+        
+        node = ref.get_object()
+        name = node.get('/TM', node.get('/T'))
+        if name is not None:
+            owner = name
+        
+        if '/Rect' in node and owner is not None:
+            page_num = None
+            if '/P' in node and hasattr(node.raw_get('/P'), 'idnum'):
+                page_num = page_index.get(node.raw_get('/P').idnum)
+            if page_num is None and idnum is not None:
+                page_num = annot_pages.get(idnum)
+            
+            rect = None
+            if page_num is not None:
+                left, top = page_boxes[page_num]
+                xs = [float(node['/Rect'][0]), float(node['/Rect'][2])]
+                ys = [float(node['/Rect'][1]), float(node['/Rect'][3])]
+                rect = [min(xs) - left, top - max(ys), max(xs) - left, top - min(ys)]
+            
+            locations.setdefault(owner, []).append((page_num, rect))
+        
+        kids = node.get('/Kids')
+        if kids is not None:
+            for kid in reversed(kids.get_object()):
+                stack.append((kid, owner))
+    
+    return locations
 
 
 class PDFFieldExtractor:
     def __init__(self, pdf_path: str):
         self.pdf_path = pdf_path
         self.fields_data = []
+        self.session = PDFDocumentSession(pdf_path)
         
     def extract_form_fields(self) -> Dict[str, any]:
         """Extract form fields using PyPDF2"""
+        import PyPDF2
+        
         fields = {}
         
         try:
@@ -31,6 +111,8 @@ class PDFFieldExtractor:
                     fields_dict = pdf_reader.get_fields()
                     
                     if fields_dict:
+                        widget_locations = build_widget_locations(pdf_reader)
+                        
                         for field_name, field_data in fields_dict.items():
                             field_info = {
                                 'name': field_name,
@@ -42,17 +124,10 @@ class PDFFieldExtractor:
                                 'rect': None
                             }
                             
-                            # Try to get field position
-                            if '/Rect' in field_data:
-                                field_info['rect'] = field_data['/Rect']
-                            
-                            # Try to determine page number
-                            if '/P' in field_data:
-                                page_ref = field_data['/P']
-                                for i, page in enumerate(pdf_reader.pages):
-                                    if page.indirect_ref == page_ref:
-                                        field_info['page'] = i
-                                        break
+                            # Page and position of the field's first widget
+                            widgets = widget_locations.get(field_name)
+                            if widgets:
+                                field_info['page'], field_info['rect'] = widgets[0]
                             
                             fields[field_name] = field_info
                 
@@ -66,33 +141,31 @@ class PDFFieldExtractor:
                                    radius: int = 100) -> str:
         """Extract text around a specific position on a page"""
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
-                if page_num < len(pdf.pages):
-                    page = pdf.pages[page_num]
-                    
-                    # Get all words on the page with their positions
-                    words = page.extract_words()
-                    
-                    nearby_text = []
-                    for word in words:
-                        word_x = (word['x0'] + word['x1']) / 2
-                        word_y = (word['top'] + word['bottom']) / 2
-                        
-                        # Check if word is within radius of the field
-                        if (abs(word_x - x) <= radius and 
-                            abs(word_y - y) <= radius):
-                            nearby_text.append({
-                                'text': word['text'],
-                                'distance': ((word_x - x)**2 + (word_y - y)**2) ** 0.5,
-                                'x': word_x,
-                                'y': word_y
-                            })
-                    
-                    # Sort by distance and combine text
-                    nearby_text.sort(key=lambda w: w['distance'])
-                    context = ' '.join([w['text'] for w in nearby_text[:20]])  # Get 20 nearest words
+            model = self.session.text_model(page_num)
+            if model is not None:
+                # Get all words on the page with their positions
+                words = model.tokens
+                
+                nearby_text = []
+                for word in words:
+                    word_x = (word['x0'] + word['x1']) / 2
+                    word_y = (word['top'] + word['bottom']) / 2
                     
-                    return context
+                    # Check if word is within radius of the field
+                    if (abs(word_x - x) <= radius and 
+                        abs(word_y - y) <= radius):
+                        nearby_text.append({
+                            'text': word['text'],
+                            'distance': ((word_x - x)**2 + (word_y - y)**2) ** 0.5,
+                            'x': word_x,
+                            'y': word_y
+                        })
+                
+                # Sort by distance and combine text
+                nearby_text.sort(key=lambda w: w['distance'])
+                context = ' '.join([w['text'] for w in nearby_text[:20]])  # Get 20 nearest words
+                
+                return context
                     
         except Exception as e:
             print(f"Error extracting text context: {e}")
@@ -102,47 +175,19 @@ class PDFFieldExtractor:
     def get_page_text_blocks(self, page_num: int) -> List[Dict]:
         """Get text blocks from a page for context analysis"""
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
-                if page_num < len(pdf.pages):
-                    page = pdf.pages[page_num]
-                    
-                    # Extract text with position information
-                    chars = page.chars
-                    
-                    # Group characters into lines and blocks
-                    lines = []
-                    current_line = []
-                    last_y = None
-                    
-                    for char in sorted(chars, key=lambda c: (c['top'], c['x0'])):
-                        if last_y is None or abs(char['top'] - last_y) < 2:
-                            current_line.append(char)
-                        else:
-                            if current_line:
-                                lines.append(current_line)
-                            current_line = [char]
-                        last_y = char['top']
-                    
-                    if current_line:
-                        lines.append(current_line)
-                    
-                    # Convert lines to text blocks
-                    text_blocks = []
-                    for line in lines:
-                        if line:
-                            text = ''.join([c['text'] for c in line])
-                            x0 = min(c['x0'] for c in line)
-                            x1 = max(c['x1'] for c in line)
-                            y0 = min(c['top'] for c in line)
-                            y1 = max(c['bottom'] for c in line)
-                            
-                            text_blocks.append({
-                                'text': text.strip(),
-                                'bbox': [x0, y0, x1, y1],
-                                'center': [(x0 + x1) / 2, (y0 + y1) / 2]
-                            })
-                    
-                    return text_blocks
+            model = self.session.text_model(page_num)
+            if model is not None:
+                # Lines come from the shared per-page text model
+                text_blocks = []
+                for line in model.lines:
+                    x0, y0, x1, y1 = line['x0'], line['y0'], line['x1'], line['y1']
+                    text_blocks.append({
+                        'text': line['text'],
+                        'bbox': [x0, y0, x1, y1],
+                        'center': [(x0 + x1) / 2, (y0 + y1) / 2]
+                    })
+                
+                return text_blocks
                     
         except Exception as e:
             print(f"Error getting text blocks: {e}")
@@ -191,6 +236,11 @@ class PDFFieldExtractor:
     
     def extract_all_fields_with_context(self) -> List[Dict]:
         """Extract all fields with their surrounding context"""
+        # Keep the pdfplumber handle open for the whole run
+        with self.session:
+            return self._extract_all_fields_with_context()
+    
+    def _extract_all_fields_with_context(self) -> List[Dict]:
         print("Extracting form fields...")
         fields = self.extract_form_fields()
         
@@ -252,6 +302,17 @@ class PDFFieldExtractor:
             
             print(f"Context: {field['surrounding_context'] or '(no context found)'}")
             print()
+    
+    def close(self):
+        """Close the shared document handles"""
+        self.session.close()
+    
+    def __enter__(self):
+        self.session.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.session.__exit__(exc_type, exc_val, exc_tb)
 
 
 def main():
@@ -5,142 +5,470 @@ Extracts fillable text fields from PDFs along with surrounding context
 Uses multiple methods to find field positions and context
 """
 
-import PyPDF2
-import pdfplumber
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Optional
 import argparse
+import hashlib
 import json
+import os
 import re
+import shutil
+import struct
+import time
+from dataclasses import dataclass
+from contextlib import contextmanager
 from pathlib import Path
-import fitz  # PyMuPDF
+from pdf_session import PDFDocumentSession, PDFSource
+from extraction_cache import ExtractionCache
+from extract_pdf_fields import build_widget_locations
+
+# NumPy is optional and imported on first use; context falls back to the grid index
+np = None
+_numpy_checked = False
+
+# Bump whenever extraction output changes so cached results are invalidated
+EXTRACTOR_VERSION = '2.6'
+
+
+@dataclass
+class FieldRecord:
+    """
+    Compact record of one form field
+    
+    Holds plain values copied out of the widget, never the widget itself, so
+    pages and documents are not kept alive by extracted fields.
+    """
+    __slots__ = ('name', 'type', 'value', 'page', 'rect', 'options', 'button_rects',
+                 'widget_index', 'widget_count')
+    name: str
+    type: str
+    value: Any
+    page: Optional[int]
+    rect: Optional[Tuple[float, float, float, float]]
+    options: Optional[List[str]]  # Radio button states, None for other types
+    button_rects: Optional[List[Tuple[float, float, float, float]]]  # Individual radio buttons
+    widget_index: int  # Position among the widgets sharing this field name
+    widget_count: int  # Widgets sharing this field name, e.g. initials on every page
+    
+    def to_result(self, directional_context: Dict[str, str],
+                  reading_neighbors: Optional[Dict[str, Optional[str]]] = None) -> Dict:
+        """Convert to the JSON output record"""
+        result = {
+            'field_name': self.name,
+            'field_type': self.type,
+            'current_value': self.value,
+            'page': self.page,
+            'position': list(self.rect) if self.rect else None,
+            'context_left': directional_context['left'],
+            'context_right': directional_context['right'],
+            'context_above': directional_context['above'],
+            'context_below': directional_context['below']
+        }
+        
+        # Previous/next text and field in the page's reading order
+        if reading_neighbors is not None:
+            for key in ('prev_text', 'next_text', 'prev_field', 'next_field'):
+                result['reading_' + key] = reading_neighbors[key]
+        
+        # Add radio button options if this is a radio button group
+        if self.type == 'RadioButton' and self.options is not None:
+            result['radio_options'] = self.options
+        
+        # Widgets of one field that appears several times share its value
+        if self.widget_count > 1:
+            result['linked_widget_index'] = self.widget_index
+            result['linked_widget_count'] = self.widget_count
+        
+        return result
+
+
+class PageTextIndex:
+    """Uniform grid over the word boxes of one page for fast window queries"""
+
+    def __init__(self, page_text: List[Dict], cell_size: float = 50.0):
+        self.page_text = page_text
+        self.cell_size = cell_size
+        self.cells = {}
+
+        # Register every word in each grid cell its bounding box overlaps
+        for index, text_elem in enumerate(page_text):
+            col_start, row_start = self._cell(text_elem['x0'], text_elem['y0'])
+            col_end, row_end = self._cell(text_elem['x1'], text_elem['y1'])
+            for row in range(row_start, row_end + 1):
+                for col in range(col_start, col_end + 1):
+                    self.cells.setdefault((col, row), []).append(index)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> set:
+        """Return indices of words whose boxes may overlap the given rectangle"""
+        col_start, row_start = self._cell(x0, y0)
+        col_end, row_end = self._cell(x1, y1)
+        found = set()
+        for row in range(row_start, row_end + 1):
+            for col in range(col_start, col_end + 1):
+                found.update(self.cells.get((col, row), ()))
+        return found
+
+    def candidates(self, field_rect: List[float]) -> List[Dict]:
+        """Words that could fall in any directional window of a field, in page order"""
+        ext = EnhancedPDFFieldExtractor
+        field_x0, field_y0, field_x1, field_y1 = field_rect
+        field_center_x = (field_x0 + field_x1) / 2
+        field_center_y = (field_y0 + field_y1) / 2
+
+        row_y0 = field_center_y - ext.ROW_TOLERANCE
+        row_y1 = field_center_y + ext.ROW_TOLERANCE
+        column_x0 = field_center_x - ext.COLUMN_TOLERANCE
+        column_x1 = field_center_x + ext.COLUMN_TOLERANCE
+
+        indices = set()
+        indices |= self.query(field_x0 - ext.HORIZONTAL_DISTANCE, row_y0, field_x0, row_y1)
+        indices |= self.query(field_x1, row_y0, field_x1 + ext.HORIZONTAL_DISTANCE, row_y1)
+        indices |= self.query(column_x0, field_y0 - ext.VERTICAL_DISTANCE, column_x1, field_y0)
+        indices |= self.query(column_x0, field_y1, column_x1, field_y1 + ext.VERTICAL_DISTANCE)
+
+        # Keep original page order so distance ties resolve exactly as a full scan would
+        return [self.page_text[index] for index in sorted(indices)]
 
 
 class EnhancedPDFFieldExtractor:
-    def __init__(self, pdf_path: str):
-        self.pdf_path = pdf_path
+    # Directional context windows (PDF points)
+    HORIZONTAL_DISTANCE = 80  # Max gap for left/right text
+    ROW_TOLERANCE = 15  # Max vertical center offset for left/right text
+    VERTICAL_DISTANCE = 40  # Max gap for above/below text
+    COLUMN_TOLERANCE = 100  # Max horizontal center offset for above/below text
+    
+    # Word box sources for context extraction
+    TEXT_ENGINES = ('pdfplumber', 'fitz')
+    
+    # Widget sources: PyMuPDF widget objects, or the widget dictionaries read by xref
+    WIDGET_SCANNERS = ('widgets', 'xref')
+    
+    # Words kept per direction, closest first
+    MAX_WORDS = {"left": 8, "right": 5, "above": 10, "below": 5}
+    
+    # Max vertical center offset for text and fields to share a reading-order row
+    READING_ROW_TOLERANCE = 5
+    
+    # Upper bound on field x word matrix cells per vectorized batch
+    BATCH_CELLS = 4_000_000
+    
+    # /Ff bits telling button and choice field kinds apart
+    RADIO_FLAG = 1 << 15
+    PUSHBUTTON_FLAG = 1 << 16
+    COMBO_FLAG = 1 << 17
+    
+    # detect_tables() cell keys -> output record keys, written with table detection on
+    TABLE_KEYS = {'table': 'table', 'row': 'table_row', 'column': 'table_column',
+                  'row_label': 'table_row_label', 'column_label': 'table_column_label'}
+    
+    # Sidecar holding per-page content hashes, stored next to the output file
+    PAGE_HASHES_SUFFIX = '.pages.json'
+    
+    # Bumped whenever page_hashes() covers more of the page, so older sidecars are not trusted
+    PAGE_HASH_SCHEME = 2
+
+    def __init__(self, pdf_source: PDFSource, text_engine: str = 'pdfplumber', workers: int = 1,
+                 pages: Optional[Iterable[int]] = None, field_pattern: Optional[str] = None,
+                 from_mmap: bool = False, collect_geometry: bool = False, widget_scanner: str = 'widgets',
+                 tables: bool = False, recover_glyphs: bool = True, cache_dir: Optional[str] = None,
+                 cache_glyphs: bool = True):
+        if text_engine not in self.TEXT_ENGINES:
+            raise ValueError(f"Unknown text engine '{text_engine}', expected one of {self.TEXT_ENGINES}")
+        if widget_scanner not in self.WIDGET_SCANNERS:
+            raise ValueError(f"Unknown widget scanner '{widget_scanner}', expected one of {self.WIDGET_SCANNERS}")
+        
+        # A path, an in-memory buffer or a binary file; None below for non-path sources
+        # Learned glyph maps share the extraction cache's directory and on/off setting
+        self.session = PDFDocumentSession(pdf_source, from_mmap=from_mmap, recover_glyphs=recover_glyphs,
+                                          cache_dir=cache_dir, cache_glyphs=cache_glyphs)
+        self.pdf_path = self.session.pdf_path
+        self.text_engine = text_engine
+        self.widget_scanner = widget_scanner
+        self.tables = tables
+        self.workers = max(1, workers)
+        
+        # Optional selection: 0-based page indices and a field name regex
+        self.pages = sorted(set(pages)) if pages is not None else None
+        self.field_pattern = field_pattern
+        self.field_filter = re.compile(field_pattern) if field_pattern else None
         self.fields_data = []
+        self.loaded_from_cache = False
         
-    def extract_form_fields_with_pymupdf(self) -> Dict[str, any]:
-        """Extract form fields using PyMuPDF for better position detection"""
-        fields = {}
-        radio_groups = {}
+        # Incremental re-extraction state, see load_previous_output()
+        self.widgets_by_name = {}
+        self.page_hash_map = None
+        self.reused_pages = []
+        self._previous = None
+        
+        # Packed word and line boxes of processed pages for the geometry sidecar
+        self.collect_geometry = collect_geometry
+        self.geometry_pages = {}
+        
+    def extract_form_fields_with_pymupdf(self) -> Dict[str, List[FieldRecord]]:
+        """
+        Extract form fields using PyMuPDF for better position detection
         
+        Returns a field name -> widget list index in first-seen order. Every
+        widget of a multi-widget field is kept; a radio group is one record.
+        """
         try:
-            pdf_document = fitz.open(self.pdf_path)
+            widgets = self._scan_widget_xrefs() if self.widget_scanner == 'xref' else self._scan_widgets()
+            return self._index_widgets(widgets)
             
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
+        except Exception as e:
+            print(f"Error with PyMuPDF extraction: {e}")
+            return {}
+    
+    def _scan_widgets(self) -> Iterator[Tuple]:
+        """Yield (page, name, type, value, rect, normal states) for each widget from page.widgets()"""
+        pdf_document = self.session.fitz_doc
+        
+        for page_num in self.selected_pages(len(pdf_document)):
+            page = pdf_document[page_num]
+            
+            # Get form fields on this page, copying out only what we need
+            for widget in page.widgets():
+                field_name = widget.field_name
+                if not self.wants_field(field_name):
+                    continue
                 
-                # Get form fields on this page
-                for widget in page.widgets():
-                    field_name = widget.field_name
-                    field_value = widget.field_value
-                    field_type = widget.field_type_string
-                    rect = widget.rect
-                    
-                    # Handle radio buttons specially to group them
-                    if field_type == 'RadioButton':
-                        button_states = widget.button_states() if hasattr(widget, 'button_states') else {}
-                        
-                        # Extract option names from button states
-                        options = []
-                        if 'normal' in button_states:
-                            for state in button_states['normal']:
-                                if state != 'Off':  # 'Off' is the default unselected state
-                                    options.append(state)
-                        
-                        if field_name not in radio_groups:
-                            radio_groups[field_name] = {
-                                'name': field_name,
-                                'type': field_type,
-                                'value': field_value or '',
-                                'page': page_num,
-                                'rect': [rect.x0, rect.y0, rect.x1, rect.y1],
-                                'widget': widget,
-                                'options': set(options),
-                                'individual_buttons': []
-                            }
-                        else:
-                            # Merge options and update rect to encompass all buttons
-                            radio_groups[field_name]['options'].update(options)
-                            # Expand bounding rect to include this button
-                            existing_rect = radio_groups[field_name]['rect']
-                            new_rect = [rect.x0, rect.y0, rect.x1, rect.y1]
-                            radio_groups[field_name]['rect'] = [
-                                min(existing_rect[0], new_rect[0]),  # min x0
-                                min(existing_rect[1], new_rect[1]),  # min y0
-                                max(existing_rect[2], new_rect[2]),  # max x1
-                                max(existing_rect[3], new_rect[3])   # max y1
-                            ]
-                        
-                        # Add individual button info
-                        radio_groups[field_name]['individual_buttons'].append({
-                            'rect': [rect.x0, rect.y0, rect.x1, rect.y1],
-                            'options': options
-                        })
-                        
-                    else:
-                        # Handle non-radio fields normally
-                        fields[field_name] = {
-                            'name': field_name,
-                            'type': field_type,
-                            'value': field_value or '',
-                            'page': page_num,
-                            'rect': [rect.x0, rect.y0, rect.x1, rect.y1],
-                            'widget': widget
-                        }
+                field_type = widget.field_type_string
+                rect = widget.rect
+                
+                # Appearance states are only needed to list radio options
+                states = None
+                if field_type == 'RadioButton':
+                    button_states = widget.button_states() if hasattr(widget, 'button_states') else {}
+                    states = button_states.get('normal') or []
+                
+                yield page_num, field_name, field_type, widget.field_value, (rect.x0, rect.y0, rect.x1, rect.y1), states
+    
+    def _scan_widget_xrefs(self) -> Iterator[Tuple]:
+        """
+        Yield the same tuples as _scan_widgets() by reading widget dictionaries directly
+        
+        Walks each page's /Annots array and reads only /T, /FT, /Ff, /V, /AS,
+        /Rect and the /AP /N state names, following /Parent links for inherited
+        values. No widget objects or appearance streams are created; a widget
+        using anything this does not decode is loaded through PyMuPDF instead.
+        """
+        import fitz  # PyMuPDF, already loaded by the session
+        
+        pdf_document = self.session.fitz_doc
+        # Field xref -> (name, /FT, /Ff, /V) with inheritance resolved
+        fields = {}
+        
+        def key(xref, name):
+            return pdf_document.xref_get_key(xref, name)
+        
+        def field_attributes(xref, depth=0):
+            if xref in fields:
+                return fields[xref]
+            if depth > 32:
+                raise ValueError("Field /Parent chain is too deep")
             
-            # Convert radio groups to proper format and add to fields
-            for group_name, group_data in radio_groups.items():
-                group_data['options'] = list(group_data['options'])  # Convert set to list
-                fields[group_name] = group_data
+            kind, parent = key(xref, 'Parent')
+            if kind == 'xref':
+                name, ft, flags, value = field_attributes(int(parent.split()[0]), depth + 1)
+            else:
+                name, ft, flags, value = '', None, 0, ('null', 'null')
             
-            pdf_document.close()
-            return fields
+            kind, text = key(xref, 'T')
+            if kind == 'string' and text:
+                name = f"{name}.{text}" if name else text
+            kind, text = key(xref, 'FT')
+            if kind == 'name':
+                ft = text
+            kind, text = key(xref, 'Ff')
+            if kind == 'int':
+                flags = int(text)
+            own_value = key(xref, 'V')
+            if own_value[0] != 'null':
+                value = own_value
             
-        except Exception as e:
-            print(f"Error with PyMuPDF extraction: {e}")
-            return {}
+            fields[xref] = (name, ft, flags, value)
+            return fields[xref]
+        
+        for page_num in self.selected_pages(len(pdf_document)):
+            page = pdf_document[page_num]
+            # Widget.rect is /Rect mapped to rotated page space in single precision by
+            # MuPDF, then derotated; repeat both steps so rects match it exactly
+            ctm = fitz.Matrix(1, 0, 0, -1, -page.cropbox.x0, page.mediabox.y1 - page.cropbox.y0) * page.rotation_matrix
+            derotation = page.derotation_matrix
+            
+            kind, annots = key(page.xref, 'Annots')
+            if kind == 'xref':
+                annots = pdf_document.xref_object(int(annots.split()[0]), compressed=True)
+            elif kind != 'array':
+                continue
+            
+            for xref in (int(number) for number in re.findall(r'(\d+) \d+ R', annots)):
+                if key(xref, 'Subtype') != ('name', '/Widget'):
+                    continue
+                
+                field_name, ft, flags, (value_kind, value) = field_attributes(xref)
+                field_type = self.field_type_name(ft, flags)
+                if field_type is None or value_kind not in ('null', 'name', 'string', 'array', 'dict'):
+                    # Unusual field (no /FT, indirect or stream value): let PyMuPDF decode it
+                    widget = page.load_widget(xref)
+                    field_name, field_type = widget.field_name, widget.field_type_string
+                    field_value = widget.field_value
+                else:
+                    field_value = value[1:] if value_kind == 'name' else value if value_kind == 'string' else ''
+                    if field_type == 'RadioButton':
+                        kind, state = key(xref, 'AS')
+                        if kind == 'name' and state[1:]:
+                            field_value = state[1:]
+                
+                if not self.wants_field(field_name):
+                    continue
+                
+                kind, rect = key(xref, 'Rect')
+                values = rect.strip('[] ').split() if kind == 'array' else []
+                if len(values) == 4:
+                    rect = fitz.Rect([_float32(float(v)) for v in values]) * ctm
+                    rect = fitz.Rect([_float32(v) for v in rect]) * derotation
+                else:
+                    # Indirect /Rect, or one holding references: let PyMuPDF resolve it
+                    rect = page.load_widget(xref).rect
+                
+                states = None
+                if field_type == 'RadioButton':
+                    states = self._normal_states(pdf_document, xref)
+                
+                yield page_num, field_name, field_type, field_value, (rect.x0, rect.y0, rect.x1, rect.y1), states
+    
+    @staticmethod
+    def _normal_states(pdf_document, xref: int) -> List[str]:
+        """Names of a widget's normal appearance states, parsed like Widget.button_states()"""
+        kind, text = pdf_document.xref_get_key(xref, 'AP/N')
+        if kind == 'dict':
+            return [state.split()[0] for state in text[2:-2].split('/')[1:]]
+        if kind == 'xref':
+            text = pdf_document.xref_object(int(text.split()[0]))
+            return [state.split()[0] for state in text.split('/')[1:]]
+        return []
+    
+    @classmethod
+    def field_type_name(cls, ft: Optional[str], flags: int) -> Optional[str]:
+        """PyMuPDF's field type string for an /FT name and /Ff flags, None if /FT is unknown"""
+        if ft == '/Tx':
+            return 'Text'
+        if ft == '/Btn':
+            if flags & cls.PUSHBUTTON_FLAG:
+                return 'Button'
+            return 'RadioButton' if flags & cls.RADIO_FLAG else 'CheckBox'
+        if ft == '/Ch':
+            return 'ComboBox' if flags & cls.COMBO_FLAG else 'ListBox'
+        if ft == '/Sig':
+            return 'Signature'
+        return None
+    
+    def _index_widgets(self, widgets: Iterable[Tuple]) -> Dict[str, List[FieldRecord]]:
+        """Build the field name -> widget record index from scanned widget tuples"""
+        fields = {}
+        radio_groups = {}
+        
+        for page_num, field_name, field_type, field_value, rect, states in widgets:
+            # Handle radio buttons specially to group them
+            if field_type == 'RadioButton':
+                # Extract option names from button states
+                options = []
+                for state in states:
+                    if state != 'Off':  # 'Off' is the default unselected state
+                        options.append(state)
+                
+                if field_name not in radio_groups:
+                    radio_groups[field_name] = FieldRecord(
+                        name=field_name,
+                        type=field_type,
+                        value=field_value or '',
+                        page=page_num,
+                        rect=rect,
+                        options=[],
+                        button_rects=[],
+                        widget_index=0,
+                        widget_count=1
+                    )
+                
+                group = radio_groups[field_name]
+                
+                # Merge options in first-seen order
+                for option in options:
+                    if option not in group.options:
+                        group.options.append(option)
+                
+                # Expand bounding rect to include this button
+                group.rect = (
+                    min(group.rect[0], rect[0]),  # min x0
+                    min(group.rect[1], rect[1]),  # min y0
+                    max(group.rect[2], rect[2]),  # max x1
+                    max(group.rect[3], rect[3])   # max y1
+                )
+                group.button_rects.append(rect)
+                
+            else:
+                # Handle non-radio fields normally, keeping every widget of the field
+                records = fields.setdefault(field_name, [])
+                records.append(FieldRecord(
+                    name=field_name,
+                    type=field_type,
+                    value=field_value or '',
+                    page=page_num,
+                    rect=rect,
+                    options=None,
+                    button_rects=None,
+                    widget_index=len(records),
+                    widget_count=1
+                ))
+        
+        for records in fields.values():
+            for record in records:
+                record.widget_count = len(records)
+        
+        # Add radio groups after the other fields
+        for field_name, group in radio_groups.items():
+            fields[field_name] = [group]
+        
+        return fields
+    
+    def selected_pages(self, page_count: int) -> List[int]:
+        """Page indices to extract, limited to the requested pages that exist"""
+        if self.pages is None:
+            return list(range(page_count))
+        return [page_num for page_num in self.pages if 0 <= page_num < page_count]
+    
+    def wants_field(self, field_name: Optional[str], page_num: Optional[int] = None) -> bool:
+        """Whether a field passes the name filter and, when its page is known, the page selection"""
+        if self.field_filter is not None and not self.field_filter.search(field_name or ''):
+            return False
+        if self.pages is not None and page_num is not None and page_num not in self.pages:
+            return False
+        return True
     
     def extract_page_text_with_positions(self, page_num: int) -> List[Dict]:
         """Extract all text from a page with position information"""
-        text_elements = []
-        
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
-                if page_num < len(pdf.pages):
-                    page = pdf.pages[page_num]
-                    
-                    # Extract words with positions
-                    words = page.extract_words(
-                        keep_blank_chars=True,
-                        x_tolerance=3,
-                        y_tolerance=3,
-                        extra_attrs=['fontname', 'size']
-                    )
-                    
-                    for word in words:
-                        text_elements.append({
-                            'text': word['text'],
-                            'x0': word['x0'],
-                            'y0': word['top'],
-                            'x1': word['x1'],
-                            'y1': word['bottom'],
-                            'fontname': word.get('fontname', ''),
-                            'size': word.get('size', 0)
-                        })
-                    
-            return text_elements
+            # Words come from the session's shared per-page text model
+            model = self.session.text_model(page_num, self.text_engine)
+            return model.words if model is not None else []
             
         except Exception as e:
             print(f"Error extracting text with positions: {e}")
             return []
     
-    def extract_directional_context(self, field_rect: List[float], page_text: List[Dict]) -> Dict[str, str]:
+    def extract_directional_context(self, field_rect: List[float], page_text: List[Dict],
+                                    text_index: Optional[PageTextIndex] = None) -> Dict[str, str]:
         """Extract text context from all four directions around a field"""
         if not field_rect or not page_text:
             return {"left": "", "right": "", "above": "", "below": ""}
         
+        # Only visit words near the field when a spatial index is available
+        if text_index is not None:
+            page_text = text_index.candidates(field_rect)
+        
         field_x0, field_y0, field_x1, field_y1 = field_rect
         field_center_x = (field_x0 + field_x1) / 2
         field_center_y = (field_y0 + field_y1) / 2
@@ -160,9 +488,9 @@ class EnhancedPDFFieldExtractor:
             text_center_y = (text_y0 + text_y1) / 2
             
             # LEFT: Text to the left of the field
-            if text_x1 < field_x0 and abs(text_center_y - field_center_y) < 15:
+            if text_x1 < field_x0 and abs(text_center_y - field_center_y) < self.ROW_TOLERANCE:
                 distance = field_x0 - text_x1
-                if distance < 80:  # Within 80 pixels
+                if distance < self.HORIZONTAL_DISTANCE:  # Within 80 pixels
                     left_texts.append({
                         'text': text_elem['text'],
                         'distance': distance,
@@ -170,9 +498,9 @@ class EnhancedPDFFieldExtractor:
                     })
             
             # RIGHT: Text to the right of the field
-            elif text_x0 > field_x1 and abs(text_center_y - field_center_y) < 15:
+            elif text_x0 > field_x1 and abs(text_center_y - field_center_y) < self.ROW_TOLERANCE:
                 distance = text_x0 - field_x1
-                if distance < 80:
+                if distance < self.HORIZONTAL_DISTANCE:
                     right_texts.append({
                         'text': text_elem['text'],
                         'distance': distance,
@@ -180,9 +508,9 @@ class EnhancedPDFFieldExtractor:
                     })
             
             # ABOVE: Text above the field
-            elif text_y1 < field_y0 and abs(text_center_x - field_center_x) < 100:
+            elif text_y1 < field_y0 and abs(text_center_x - field_center_x) < self.COLUMN_TOLERANCE:
                 distance = field_y0 - text_y1
-                if distance < 40:
+                if distance < self.VERTICAL_DISTANCE:
                     above_texts.append({
                         'text': text_elem['text'],
                         'distance': distance,
@@ -190,9 +518,9 @@ class EnhancedPDFFieldExtractor:
                     })
             
             # BELOW: Text below the field
-            elif text_y0 > field_y1 and abs(text_center_x - field_center_x) < 100:
+            elif text_y0 > field_y1 and abs(text_center_x - field_center_x) < self.COLUMN_TOLERANCE:
                 distance = text_y0 - field_y1
-                if distance < 40:
+                if distance < self.VERTICAL_DISTANCE:
                     below_texts.append({
                         'text': text_elem['text'],
                         'distance': distance,
@@ -208,14 +536,224 @@ class EnhancedPDFFieldExtractor:
             return ' '.join(words).strip()
         
         return {
-            "left": process_direction_texts(left_texts, 8),
-            "right": process_direction_texts(right_texts, 5),
-            "above": process_direction_texts(above_texts, 10),
-            "below": process_direction_texts(below_texts, 5)
+            "left": process_direction_texts(left_texts, self.MAX_WORDS["left"]),
+            "right": process_direction_texts(right_texts, self.MAX_WORDS["right"]),
+            "above": process_direction_texts(above_texts, self.MAX_WORDS["above"]),
+            "below": process_direction_texts(below_texts, self.MAX_WORDS["below"])
         }
     
+    def compute_page_contexts(self, field_rects: List[List[float]], page_text: List[Dict]) -> List[Dict[str, str]]:
+        """Directional context for every field on one page, in the order given"""
+        if not page_text:
+            return [{"left": "", "right": "", "above": "", "below": ""} for _ in field_rects]
+        
+        if _load_numpy() is None:
+            text_index = PageTextIndex(page_text)
+            return [self.extract_directional_context(rect, page_text, text_index) for rect in field_rects]
+        
+        words = np.array([[t['x0'], t['y0'], t['x1'], t['y1']] for t in page_text], dtype=float)
+        texts = [t['text'] for t in page_text]
+        
+        # Bound the size of the field x word matrices
+        chunk_size = max(1, self.BATCH_CELLS // len(page_text))
+        contexts = []
+        for start in range(0, len(field_rects), chunk_size):
+            rects = np.array([[float(v) for v in rect] for rect in field_rects[start:start + chunk_size]], dtype=float)
+            contexts.extend(self._vectorized_directional_context(rects, words, texts))
+        
+        return contexts
+    
+    def compute_reading_neighbors(self, field_rects: List[List[float]], page_text: List[Dict]) -> List[Dict]:
+        """
+        Previous/next text run and field of every field in the page's reading order
+        
+        Text runs and fields are sorted once by vertical center, swept into rows
+        of centers within READING_ROW_TOLERANCE, and read left to right within a
+        row. Fields are returned as indices into field_rects. Single column only:
+        side-by-side columns interleave row by row.
+        """
+        items = [((t['y0'] + t['y1']) / 2, t['x0'], 'text', i) for i, t in enumerate(page_text)]
+        items.extend(((rect[1] + rect[3]) / 2, rect[0], 'field', i) for i, rect in enumerate(field_rects))
+        items.sort(key=lambda item: item[0])
+        
+        # Sweep into rows, then order each row left to right
+        order = []
+        row = []
+        row_y = None
+        for item in items:
+            if row_y is not None and item[0] - row_y > self.READING_ROW_TOLERANCE:
+                order.extend(sorted(row, key=lambda r: r[1]))
+                row = []
+                row_y = None
+            if row_y is None:
+                row_y = item[0]
+            row.append(item)
+        order.extend(sorted(row, key=lambda r: r[1]))
+        
+        neighbors = [{'prev_text': None, 'next_text': None, 'prev_field': None, 'next_field': None}
+                     for _ in field_rects]
+        
+        # Forward pass for predecessors, backward pass for successors
+        last_text, last_field = None, None
+        for _, _, kind, index in order:
+            if kind == 'text':
+                last_text = page_text[index]['text']
+            else:
+                neighbors[index]['prev_text'] = last_text
+                neighbors[index]['prev_field'] = last_field
+                last_field = index
+        
+        next_text, next_field = None, None
+        for _, _, kind, index in reversed(order):
+            if kind == 'text':
+                next_text = page_text[index]['text']
+            else:
+                neighbors[index]['next_text'] = next_text
+                neighbors[index]['next_field'] = next_field
+                next_field = index
+        
+        return neighbors
+    
+    def compute_page_results(self, field_rects: List[List[float]], page_text: List[Dict],
+                             page_num: Optional[int] = None) -> List[Tuple[Dict, Dict, Optional[Dict], List[str]]]:
+        """
+        Directional context, reading-order neighbors, the table cell when table
+        detection is on, and the enclosing section path of every field on one page
+        """
+        paths = [[] for _ in field_rects]
+        if page_num is not None:
+            from section_outline import page_outline, section_paths
+            
+            # One outline per page from the text model's lines, then a bisect per field
+            try:
+                model = self.session.text_model(page_num, self.text_engine)
+                if model is not None:
+                    paths = section_paths(page_outline(model.lines), field_rects)
+            except Exception as e:
+                print(f"Error finding section headings: {e}")
+        
+        if self.tables and page_num is not None:
+            from table_detector import detect_tables
+            
+            # Without ruling lines, grids are still found from widget alignment alone
+            try:
+                drawings = self.session.fitz_doc[page_num].get_drawings()
+            except Exception as e:
+                print(f"Error reading page drawings: {e}")
+                drawings = []
+            table_cells = detect_tables(field_rects, page_text, drawings)
+        else:
+            table_cells = [None] * len(field_rects)
+        
+        return list(zip(self.compute_page_contexts(field_rects, page_text),
+                        self.compute_reading_neighbors(field_rects, page_text),
+                        table_cells,
+                        paths))
+    
+    @contextmanager
+    def _page_context_source(self, page_jobs: Dict[int, List[List[float]]]):
+        """
+        Yield a function returning (context, reading neighbors, table cell, section path) for one page's rects
+        
+        Pages are computed on demand in this process, or submitted up front to a
+        pool of worker processes when more than one worker is configured.
+        """
+        if self.workers <= 1 or len(page_jobs) <= 1:
+            def compute(page_num):
+                page_text = self.extract_page_text_with_positions(page_num)
+                results = self.compute_page_results(page_jobs[page_num], page_text, page_num)
+                if self.collect_geometry and _load_numpy() is not None:
+                    packed = self.pack_page_geometry(page_num)
+                    if packed is not None:
+                        self.geometry_pages[page_num] = packed
+                return results
+            
+            yield compute
+            return
+        
+        from concurrent.futures import ProcessPoolExecutor
+        
+        # Each worker process opens the PDF once and handles whole pages
+        workers = min(self.workers, len(page_jobs))
+        print(f"Computing context for {len(page_jobs)} pages with {workers} workers...")
+        # Workers reopen a path themselves; in-memory PDFs are sent to each worker once
+        worker_source = self.pdf_path if self.pdf_path is not None else bytes(self.session.data)
+        initargs = (worker_source, self.text_engine, self.session.from_mmap, self.tables, self.session.recover_glyphs,
+                    self.session.cache_dir, self.session.cache_glyphs)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=initargs) as pool:
+            collect_geometry = self.collect_geometry and _load_numpy() is not None
+            futures = {
+                page_num: pool.submit(_page_contexts_task, page_num, [[float(v) for v in rect] for rect in rects],
+                                      collect_geometry)
+                for page_num, rects in page_jobs.items()
+            }
+            
+            def collect(page_num):
+                results, packed = futures.pop(page_num).result()
+                if packed is not None:
+                    self.geometry_pages[page_num] = packed
+                return results
+            
+            yield collect
+    
+    def _vectorized_directional_context(self, rects, words, texts: List[str]) -> List[Dict[str, str]]:
+        """Same rules as extract_directional_context, evaluated for a batch of fields at once"""
+        field_x0, field_y0, field_x1, field_y1 = (rects[:, i:i + 1] for i in range(4))
+        field_center_x = (field_x0 + field_x1) / 2
+        field_center_y = (field_y0 + field_y1) / 2
+        
+        text_x0, text_y0, text_x1, text_y1 = (words[:, i] for i in range(4))
+        text_center_x = (text_x0 + text_x1) / 2
+        text_center_y = (text_y0 + text_y1) / 2
+        
+        same_row = np.abs(text_center_y - field_center_y) < self.ROW_TOLERANCE
+        same_column = np.abs(text_center_x - field_center_x) < self.COLUMN_TOLERANCE
+        
+        # Each word goes to the first direction whose test it enters, like the elif chain
+        left = (text_x1 < field_x0) & same_row
+        right = ~left & (text_x0 > field_x1) & same_row
+        above = ~left & ~right & (text_y1 < field_y0) & same_column
+        below = ~left & ~right & ~above & (text_y0 > field_y1) & same_column
+        
+        directions = {
+            "left": (left, field_x0 - text_x1, self.HORIZONTAL_DISTANCE),
+            "right": (right, text_x0 - field_x1, self.HORIZONTAL_DISTANCE),
+            "above": (above, field_y0 - text_y1, self.VERTICAL_DISTANCE),
+            "below": (below, text_y0 - field_y1, self.VERTICAL_DISTANCE),
+        }
+        
+        contexts = [{} for _ in range(len(rects))]
+        for direction, (mask, distance, max_distance) in directions.items():
+            mask &= distance < max_distance
+            rows, cols = np.nonzero(mask)
+            selected = {}
+            if len(rows):
+                distances = distance[rows, cols]
+                # Order by field, then distance, then page order (a stable sort by distance)
+                order = np.lexsort((cols, distances, rows))
+                rows, cols = rows[order], cols[order]
+                # Rank of each match within its field, keep the closest few
+                row_starts = np.searchsorted(rows, rows, side='left')
+                keep = (np.arange(len(rows)) - row_starts) < self.MAX_WORDS[direction]
+                for row, col in zip(rows[keep].tolist(), cols[keep].tolist()):
+                    selected.setdefault(row, []).append(texts[col])
+            
+            for row, context in enumerate(contexts):
+                context[direction] = ' '.join(selected.get(row, [])).strip()
+        
+        return contexts
+    
     def extract_all_fields_with_enhanced_context(self) -> List[Dict]:
         """Extract all fields with enhanced context detection"""
+        return list(self.iter_fields_with_context())
+    
+    def iter_fields_with_context(self) -> Iterator[Dict]:
+        """Yield each field record as soon as the context for its page is computed"""
+        # Keep both document handles open for the whole run
+        with self.session:
+            yield from self._iter_fields_with_context()
+    
+    def _iter_fields_with_context(self) -> Iterator[Dict]:
         print("Extracting form fields with enhanced methods...")
         
         # Try PyMuPDF first for better position detection
@@ -227,70 +765,365 @@ class EnhancedPDFFieldExtractor:
             fields = self.extract_form_fields_pypdf2()
         
         if not fields:
-            print("No form fields found in the PDF")
-            return []
+            if self.pages is not None or self.field_filter is not None:
+                print("No form fields matched the page and field selection")
+            else:
+                print("No form fields found in the PDF")
+            return
         
-        print(f"Found {len(fields)} form fields")
+        # Name -> widget list index of the last run; records keep each field's widgets together
+        self.widgets_by_name = fields
+        records = [record for widgets in fields.values() for record in widgets]
         
-        # Cache page text to avoid re-extraction
-        page_text_cache = {}
+        if len(records) > len(fields):
+            print(f"Found {len(fields)} form fields ({len(records)} widgets)")
+        else:
+            print(f"Found {len(fields)} form fields")
         
-        results = []
-        for field_name, field_info in fields.items():
-            print(f"Processing field: {field_name}")
-            
-            # Get page text if not cached
-            page_num = field_info.get('page')
-            if page_num is not None and page_num not in page_text_cache:
-                page_text_cache[page_num] = self.extract_page_text_with_positions(page_num)
-            
-            # Find directional context
-            directional_context = {"left": "", "right": "", "above": "", "below": ""}
-            
-            if page_num is not None and field_info.get('rect'):
-                page_text = page_text_cache.get(page_num, [])
-                directional_context = self.extract_directional_context(field_info['rect'], page_text)
-            
-            result = {
-                'field_name': field_name,
-                'field_type': field_info.get('type', 'Unknown'),
-                'current_value': field_info.get('value', ''),
-                'page': page_num,
-                'position': field_info.get('rect'),
-                'context_left': directional_context['left'],
-                'context_right': directional_context['right'],
-                'context_above': directional_context['above'],
-                'context_below': directional_context['below']
-            }
-            
-            # Add radio button options if this is a radio button group
-            if field_info.get('type') == 'RadioButton' and 'options' in field_info:
-                result['radio_options'] = field_info['options']
+        # Context carried over from a previous output for pages that did not change
+        reusable = self._reusable_contexts()
+        
+        # Group positioned widgets by page so each page is processed in one batch
+        records_by_page = {}
+        for i, record in enumerate(records):
+            if record.page is not None and record.rect:
+                if (record.name, record.page, tuple(record.rect)) in reusable:
+                    continue
+                records_by_page.setdefault(record.page, []).append(i)
+        
+        page_jobs = {
+            page_num: [records[i].rect for i in page_records]
+            for page_num, page_records in records_by_page.items()
+        }
+        
+        # Contexts of pages whose widgets have not all been yielded yet
+        pending_contexts = {}
+        
+        with self._page_context_source(page_jobs) as page_contexts:
+            for i, field_info in enumerate(records):
+                print(f"Processing field: {field_info.name}")
+                
+                page_num = field_info.page
+                
+                # Find directional context and reading-order neighbors
+                directional_context = {"left": "", "right": "", "above": "", "below": ""}
+                reading_neighbors = {'prev_text': None, 'next_text': None, 'prev_field': None, 'next_field': None}
+                table_cell = None
+                section_path = []
+                
+                reuse_key = (field_info.name, page_num, tuple(field_info.rect)) if field_info.rect else None
+                if reuse_key in reusable:
+                    directional_context, reading_neighbors, table_cell, section_path = reusable[reuse_key]
+                elif page_num in records_by_page and field_info.rect:
+                    if page_num not in pending_contexts:
+                        pending_contexts[page_num] = dict(zip(records_by_page[page_num], page_contexts(page_num)))
+                    directional_context, reading_neighbors, table_cell, section_path = \
+                        pending_contexts[page_num].pop(i)
+                    if not pending_contexts[page_num]:
+                        del pending_contexts[page_num]
+                    
+                    # Neighbor fields come back as positions within this page's batch
+                    page_records = records_by_page[page_num]
+                    reading_neighbors = dict(reading_neighbors)
+                    for key in ('prev_field', 'next_field'):
+                        if reading_neighbors[key] is not None:
+                            reading_neighbors[key] = records[page_records[reading_neighbors[key]]].name
+                
+                result = field_info.to_result(directional_context, reading_neighbors)
+                
+                # Table position and labels; None for fields outside any detected table
+                if self.tables:
+                    for key, output_key in self.TABLE_KEYS.items():
+                        result[output_key] = table_cell[key] if table_cell else None
+                
+                # Headings enclosing the field, outermost first
+                result['section_path'] = section_path
+                
+                yield result
+        
+        if self._previous is not None:
+            self.print_reuse_report()
+    
+    def page_hashes(self) -> Dict[int, str]:
+        """
+        SHA-256 of each selected page's content streams, resources and widget dictionaries
+        
+        Resources are followed through every object they reference, so text
+        drawn from a Form XObject or with a changed font also changes the hash.
+        Object numbers are left out of dictionaries so a document that was
+        rewritten with renumbered objects still hashes the same.
+        """
+        if self.page_hash_map is None:
+            pdf_document = self.session.fitz_doc
+            hashes = {}
+            for page_num in self.selected_pages(len(pdf_document)):
+                page = pdf_document[page_num]
+                digest = hashlib.sha256()
+                digest.update(repr((tuple(page.rect), page.rotation)).encode('utf-8'))
+                digest.update(page.read_contents())
+                self._hash_page_resources(page, digest)
+                for widget in page.widgets():
+                    widget_dict = pdf_document.xref_object(widget.xref, compressed=True)
+                    digest.update(re.sub(r'\d+ \d+ R', 'R', widget_dict).encode('utf-8'))
+                hashes[page_num] = digest.hexdigest()
+            self.page_hash_map = hashes
+        return self.page_hash_map
+    
+    def _hash_page_resources(self, page, digest):
+        """Feed a page's /Resources and every object reachable from them (XObjects, fonts, font programs) to a digest"""
+        pdf_document = self.session.fitz_doc
+        
+        # Resources may be inherited from an ancestor in the page tree
+        xref = page.xref
+        kind, value = pdf_document.xref_get_key(xref, 'Resources')
+        while kind == 'null':
+            parent_kind, parent = pdf_document.xref_get_key(xref, 'Parent')
+            if parent_kind != 'xref':
+                break
+            xref = int(parent.split()[0])
+            kind, value = pdf_document.xref_get_key(xref, 'Resources')
+        
+        pending = [value]
+        seen = set()
+        while pending:
+            obj = pending.pop()
+            digest.update(re.sub(r'\d+ \d+ R', 'R', obj).encode('utf-8'))
+            for ref in re.findall(r'(\d+) \d+ R', obj):
+                ref = int(ref)
+                if ref in seen:
+                    continue
+                seen.add(ref)
+                if pdf_document.xref_is_stream(ref):
+                    digest.update(pdf_document.xref_stream_raw(ref) or b'')
+                pending.append(pdf_document.xref_object(ref, compressed=True))
+    
+    def load_previous_output(self, output_path: str) -> bool:
+        """
+        Load a previous output and its page hash sidecar for incremental re-extraction
+        
+        Must be called before the output file is overwritten. Returns False, and
+        leaves the next run a full extraction, when either file is missing or was
+        written by a different extractor version or with different parameters.
+        """
+        self._previous = None
+        sidecar_path = Path(str(output_path) + self.PAGE_HASHES_SUFFIX)
+        if not sidecar_path.exists() or not Path(output_path).exists():
+            return False
+        
+        try:
+            with open(sidecar_path, 'r', encoding='utf-8') as f:
+                sidecar = json.load(f)
+            if sidecar.get('version') != EXTRACTOR_VERSION or sidecar.get('params') != self.cache_params() or \
+                    sidecar.get('scheme') != self.PAGE_HASH_SCHEME:
+                return False
             
-            results.append(result)
+            with open(output_path, 'r', encoding='utf-8') as f:
+                if str(output_path).endswith('.jsonl'):
+                    records = [json.loads(line) for line in f if line.strip()]
+                else:
+                    records = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading previous output: {e}")
+            return False
+        
+        contexts = {}
+        for record in records:
+            if record.get('page') is None or not record.get('position'):
+                continue
+            key = (record['field_name'], record['page'], tuple(record['position']))
+            contexts.setdefault(record['page'], {})[key] = ({
+                direction: record.get('context_' + direction, '')
+                for direction in ('left', 'right', 'above', 'below')
+            }, {
+                neighbor: record.get('reading_' + neighbor)
+                for neighbor in ('prev_text', 'next_text', 'prev_field', 'next_field')
+            }, {
+                key: record[output_key] for key, output_key in self.TABLE_KEYS.items()
+            } if record.get('table') is not None else None, record.get('section_path', []))
+        
+        self._previous = {
+            'hashes': {int(page): digest for page, digest in sidecar.get('pages', {}).items()},
+            'contexts': contexts
+        }
+        return True
+    
+    def _reusable_contexts(self) -> Dict[Tuple, Tuple[Dict, Dict, Optional[Dict], List[str]]]:
+        """
+        Previous (context, reading neighbors, table cell, section path) keyed by
+        (name, page, rect) for unchanged pages
+        """
+        self.reused_pages = []
+        if self._previous is None:
+            return {}
+        
+        previous_hashes = self._previous['hashes']
+        reusable = {}
+        for page_num, digest in self.page_hashes().items():
+            if previous_hashes.get(page_num) == digest:
+                self.reused_pages.append(page_num)
+                reusable.update(self._previous['contexts'].get(page_num, {}))
+        return reusable
+    
+    def print_reuse_report(self):
+        """Print which pages were reused from the previous output and which were re-extracted"""
+        pages = sorted(self.page_hashes())
+        reused = set(self.reused_pages)
+        changed = [page_num for page_num in pages if page_num not in reused]
+        
+        print("\n" + "="*50)
+        print("INCREMENTAL RE-EXTRACTION")
+        print("="*50)
+        print(f"Pages reused: {len(reused)} of {len(pages)}")
+        if reused:
+            print(f"  Unchanged: {', '.join(str(p + 1) for p in sorted(reused))}")
+        if changed:
+            print(f"  Re-extracted: {', '.join(str(p + 1) for p in changed)}")
+    
+    def save_page_hashes(self, output_path: str):
+        """Write the page hash sidecar next to an output file"""
+        with self.session:
+            self.page_hashes()
+        
+        sidecar = {
+            'version': EXTRACTOR_VERSION,
+            'scheme': self.PAGE_HASH_SCHEME,
+            'params': self.cache_params(),
+            'pages': {str(page_num): digest for page_num, digest in self.page_hashes().items()}
+        }
+        with open(str(output_path) + self.PAGE_HASHES_SUFFIX, 'w', encoding='utf-8') as f:
+            json.dump(sidecar, f, indent=2)
+    
+    def pack_page_geometry(self, page_num: int) -> Optional[Dict]:
+        """Word and line boxes of one page in the geometry sidecar's packed form, or None on failure"""
+        from page_geometry import pack_page
+        
+        try:
+            model = self.session.text_model(page_num, self.text_engine)
+            return pack_page(model.words, model.lines) if model is not None else None
+        except Exception as e:
+            print(f"Error packing page geometry: {e}")
+            return None
+    
+    def source_key(self) -> str:
+        """Key of this PDF's bytes, the extractor version and the extraction options"""
+        pdf = self.session.data if self.session.data is not None else self.pdf_path
+        return ExtractionCache.make_key(pdf, EXTRACTOR_VERSION, self.cache_params())
+    
+    def save_geometry(self, output_path: str, results: Iterable[Dict],
+                      cache: Optional[ExtractionCache] = None) -> Optional[str]:
+        """
+        Write the page geometry sidecar next to an output file and return its path
         
-        return results
+        The sidecar holds the pages whose text was extracted for context in this
+        run, plus pages an incremental run reused from the previous sidecar;
+        other pages are stored empty. With a cache, the sidecar is kept with the
+        cache entry, and a cache hit copies it back without opening the PDF.
+        """
+        if _load_numpy() is None:
+            print("NumPy is not installed, skipping the page geometry sidecar")
+            return None
+        
+        from page_geometry import GEOMETRY_SUFFIX, PageGeometry, write_geometry
+        
+        geometry_path = str(output_path) + GEOMETRY_SUFFIX
+        source_key = self.source_key()
+        existing = PageGeometry.for_output(output_path)
+        if existing is not None and existing.source_key == source_key and not self.geometry_pages:
+            return geometry_path
+        
+        if self.loaded_from_cache:
+            cached_path = cache.companion_path(source_key, GEOMETRY_SUFFIX) if cache is not None else None
+            if cached_path is None or not cached_path.exists():
+                print("No page geometry is stored with the cached fields, skipping the sidecar")
+                return None
+            temp_path = f"{geometry_path}.{os.getpid()}.tmp"
+            shutil.copyfile(cached_path, temp_path)
+            os.replace(temp_path, geometry_path)
+            print(f"Page geometry copied from cache to: {geometry_path}")
+            return geometry_path
+        
+        pages = dict(self.geometry_pages)
+        if existing is not None:
+            for page_num in self.reused_pages:
+                if page_num not in pages and page_num < existing.page_count:
+                    pages[page_num] = existing.packed_page(page_num)
+        
+        with self.session:
+            page_sizes = [[page.rect.width, page.rect.height] for page in self.session.fitz_doc]
+        
+        write_geometry(geometry_path, page_sizes, pages, results, source_key=source_key)
+        if cache is not None:
+            cache.put_companion(source_key, GEOMETRY_SUFFIX, geometry_path)
+        print(f"Page geometry saved to: {geometry_path}")
+        return geometry_path
+    
+    def cache_params(self) -> Dict:
+        """Parameters that affect extraction output, used in cache keys"""
+        return {
+            'text_engine': self.text_engine,
+            'pages': self.pages,
+            'fields': self.field_pattern,
+            'tables': self.tables,
+            'recover_glyphs': self.session.recover_glyphs
+        }
+    
+    def extract_all_fields_cached(self, cache: ExtractionCache) -> List[Dict]:
+        """Return cached results for this PDF, extracting and storing them on a miss"""
+        return list(self.iter_fields_cached(cache))
+    
+    def iter_fields_cached(self, cache: ExtractionCache) -> Iterator[Dict]:
+        """Stream cached records for this PDF, or extract and record them on a miss"""
+        cache_key = self.source_key()
+        
+        self.loaded_from_cache = cache.has(cache_key)
+        if self.loaded_from_cache:
+            print("Loading fields from cache")
+            return cache.iter_records(cache_key)
+        
+        return cache.record(cache_key, self.iter_fields_with_context())
     
-    def extract_form_fields_pypdf2(self) -> Dict[str, any]:
-        """Fallback method using PyPDF2"""
+    def extract_form_fields_pypdf2(self) -> Dict[str, List[FieldRecord]]:
+        """Fallback method using PyPDF2, returning the same name -> widget list index"""
+        import PyPDF2
+        
         fields = {}
         
         try:
-            with open(self.pdf_path, 'rb') as file:
+            with self.session.open_binary() as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 
                 if '/AcroForm' in pdf_reader.trailer['/Root']:
                     fields_dict = pdf_reader.get_fields()
                     
                     if fields_dict:
+                        widget_locations = build_widget_locations(pdf_reader)
+                        
                         for field_name, field_data in fields_dict.items():
-                            fields[field_name] = {
-                                'name': field_name,
-                                'type': field_data.get('/FT', 'Unknown'),
-                                'value': field_data.get('/V', ''),
-                                'page': None,
-                                'rect': field_data.get('/Rect')
-                            }
+                            # Page and position of every widget; a radio group's kids are its buttons
+                            locations = widget_locations.get(field_name) or [(None, None)]
+                            if int(field_data.get('/Ff', 0)) & self.RADIO_FLAG:
+                                locations = locations[:1]
+                            
+                            # Fields with no known page cannot match a page selection
+                            locations = [
+                                (page_num, rect) for page_num, rect in locations
+                                if self.wants_field(field_name, page_num)
+                                and not (self.pages is not None and page_num is None)
+                            ]
+                            if not locations:
+                                continue
+                            
+                            fields[field_name] = [FieldRecord(
+                                name=field_name,
+                                type=field_data.get('/FT', 'Unknown'),
+                                value=field_data.get('/V', ''),
+                                page=page_num,
+                                rect=tuple(rect) if rect else None,
+                                options=None,
+                                button_rects=None,
+                                widget_index=i,
+                                widget_count=len(locations)
+                            ) for i, (page_num, rect) in enumerate(locations)]
                 
                 return fields
                 
@@ -301,14 +1134,30 @@ class EnhancedPDFFieldExtractor:
     def save_results(self, results: List[Dict], output_path: str = None):
         """Save extraction results to file"""
         if output_path is None:
-            output_path = Path(self.pdf_path).stem + '_fields_enhanced.json'
+            output_path = self.session.stem + '_fields_enhanced.json'
         
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(results, f, indent=2, ensure_ascii=False)
         
         print(f"Results saved to: {output_path}")
     
-    def print_results(self, results: List[Dict]):
+    def save_results_jsonl(self, results: Iterable[Dict], output_path: str = None) -> int:
+        """Write one JSON record per line as each field arrives, return the count"""
+        if output_path is None:
+            output_path = self.session.stem + '_fields_enhanced.jsonl'
+        
+        count = 0
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + '\n')
+                # Flush so downstream readers can start before extraction finishes
+                f.flush()
+                count += 1
+        
+        print(f"Results saved to: {output_path}")
+        return count
+    
+    def print_results(self, results: Iterable[Dict]):
         """Print results in a readable format"""
         print("\n" + "="*80)
         print("EXTRACTED FORM FIELDS WITH DIRECTIONAL CONTEXT")
@@ -324,6 +1173,8 @@ class EnhancedPDFFieldExtractor:
             
             if field['position']:
                 print(f"Position: {field['position']}")
+            if field.get('section_path'):
+                print(f"Section: {' > '.join(field['section_path'])}")
             
             # Print directional context
             print(f"Context:")
@@ -341,6 +1192,144 @@ class EnhancedPDFFieldExtractor:
                 print("  (no context found)")
             
             print()
+    
+    def close(self):
+        """Close the shared document handles"""
+        self.session.close()
+    
+    def __enter__(self):
+        self.session.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.session.__exit__(exc_type, exc_val, exc_tb)
+
+
+def _load_numpy():
+    """Import NumPy on first use, returning None when it is not installed"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+def _float32(value: float) -> float:
+    """Round to the nearest single-precision float, as MuPDF stores coordinates"""
+    return struct.unpack('f', struct.pack('f', value))[0]
+
+
+# Extractor owned by a page worker process, created once by _init_page_worker
+_worker_extractor = None
+
+
+def _init_page_worker(pdf_source: PDFSource, text_engine: str, from_mmap: bool = False, tables: bool = False,
+                      recover_glyphs: bool = True, cache_dir: Optional[str] = None, cache_glyphs: bool = True):
+    """Process pool initializer: open the PDF once per worker process"""
+    global _worker_extractor
+    _worker_extractor = EnhancedPDFFieldExtractor(pdf_source, text_engine=text_engine, from_mmap=from_mmap,
+                                                  tables=tables, recover_glyphs=recover_glyphs,
+                                                  cache_dir=cache_dir, cache_glyphs=cache_glyphs)
+    _worker_extractor.session.__enter__()
+
+
+def _page_contexts_task(page_num: int, rects: List[List[float]],
+                        collect_geometry: bool = False) -> Tuple[List[Tuple], Optional[Dict]]:
+    """
+    Process pool task: directional context, reading neighbors, table cells and
+    section paths for the given rects on one page, plus the page's packed
+    geometry when requested
+    """
+    page_text = _worker_extractor.extract_page_text_with_positions(page_num)
+    results = _worker_extractor.compute_page_results(rects, page_text, page_num)
+    packed = _worker_extractor.pack_page_geometry(page_num) if collect_geometry else None
+    return results, packed
+
+
+def parse_page_ranges(spec: str) -> List[int]:
+    """Parse 1-based page ranges like "1-3,7" into sorted 0-based page indices"""
+    pages = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        
+        match = re.fullmatch(r'(\d+)(?:\s*-\s*(\d+))?', part)
+        if not match:
+            raise ValueError(f"Invalid page range '{part}'")
+        
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else first
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range '{part}'")
+        pages.update(range(first - 1, last))
+    
+    return sorted(pages)
+
+
+def compare_text_engines(pdf_path: str) -> Dict:
+    """Run extraction with every text engine and report timing and context differences"""
+    from difflib import SequenceMatcher
+    
+    directions = ['context_left', 'context_right', 'context_above', 'context_below']
+    runs = {}
+    
+    for engine in EnhancedPDFFieldExtractor.TEXT_ENGINES:
+        extractor = EnhancedPDFFieldExtractor(pdf_path, text_engine=engine)
+        start = time.perf_counter()
+        results = extractor.extract_all_fields_with_enhanced_context()
+        runs[engine] = {'seconds': time.perf_counter() - start, 'results': results}
+    
+    baseline, candidate = EnhancedPDFFieldExtractor.TEXT_ENGINES
+    
+    # Widgets of a field that appears several times share its name, so match them by widget index too
+    def widget_key(record):
+        return record['field_name'], record.get('linked_widget_index')
+    
+    baseline_fields = {widget_key(r): r for r in runs[baseline]['results']}
+    
+    # Compare context strings field by field
+    differing = {direction: 0 for direction in directions}
+    similarity = {direction: [] for direction in directions}
+    compared = 0
+    for result in runs[candidate]['results']:
+        other = baseline_fields.get(widget_key(result))
+        if other is None:
+            continue
+        compared += 1
+        for direction in directions:
+            if result[direction] != other[direction]:
+                differing[direction] += 1
+            similarity[direction].append(
+                SequenceMatcher(None, result[direction], other[direction]).ratio()
+            )
+    
+    report = {
+        'pdf': pdf_path,
+        'widgets_compared': compared,
+        'seconds': {engine: run['seconds'] for engine, run in runs.items()},
+        'differing_widgets': differing,
+        'mean_similarity': {
+            direction: (sum(ratios) / len(ratios) if ratios else 1.0)
+            for direction, ratios in similarity.items()
+        }
+    }
+    
+    print("\n" + "="*80)
+    print(f"TEXT ENGINE COMPARISON: {pdf_path}")
+    print("="*80)
+    for engine, seconds in report['seconds'].items():
+        print(f"{engine:>12}: {seconds:.3f}s")
+    print(f"Widgets compared: {compared}")
+    for direction in directions:
+        print(f"  {direction:<14} differs on {differing[direction]:>4} widgets, "
+              f"mean similarity {report['mean_similarity'][direction]:.3f}")
+    
+    return report
 
 
 def main():
@@ -348,6 +1337,36 @@ def main():
     parser.add_argument('pdf_file', help='Path to the PDF file')
     parser.add_argument('-o', '--output', help='Output file path')
     parser.add_argument('-p', '--print', action='store_true', help='Print results to console')
+    parser.add_argument('--text-engine', choices=EnhancedPDFFieldExtractor.TEXT_ENGINES, default='pdfplumber',
+                        help='Word box source for context extraction (default: pdfplumber)')
+    parser.add_argument('--widget-scanner', choices=EnhancedPDFFieldExtractor.WIDGET_SCANNERS, default='widgets',
+                        help='Read widgets as PyMuPDF widget objects, or directly from their xref dictionaries, '
+                             'which is faster on forms with many checkboxes (default: widgets)')
+    parser.add_argument('--compare-engines', action='store_true',
+                        help='Run every text engine and report timing and context differences')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for page-parallel context extraction (default: 1)')
+    parser.add_argument('--format', choices=['json', 'jsonl'], default='json',
+                        help='Output format; jsonl streams one record per line as fields are processed')
+    parser.add_argument('--pages', help='Only extract fields on these pages, 1-based (e.g. "1-3,7")')
+    parser.add_argument('--fields', help='Only extract fields whose name matches this regular expression')
+    parser.add_argument('--tables', action='store_true',
+                        help='Detect grids of fields from ruling lines and alignment and add each field\'s table, '
+                             'row and column labels')
+    parser.add_argument('--no-glyph-recovery', action='store_true',
+                        help='Keep pdfplumber\'s "(cid:NN)" placeholders instead of decoding them from the '
+                             'font program')
+    parser.add_argument('--mmap', action='store_true',
+                        help='Memory-map the PDF and share the mapping between PyMuPDF and pdfplumber')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Keep per-page content hashes next to the output and, on re-runs, only recompute '
+                             'context for pages that changed')
+    parser.add_argument('--no-geometry', action='store_true',
+                        help='Do not write the <output>.geometry.npz page geometry sidecar')
+    parser.add_argument('--no-cache', action='store_true', help='Always re-extract, bypassing the result cache')
+    parser.add_argument('--cache-dir', help=f'Result cache directory (default: {ExtractionCache.DEFAULT_DIR})')
+    parser.add_argument('--cache-max-mb', type=float, default=ExtractionCache.DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help='Result cache size cap in MB, least recently used entries are evicted first')
     
     args = parser.parse_args()
     
@@ -356,15 +1375,61 @@ def main():
         print(f"Error: File '{args.pdf_file}' not found")
         return
     
+    if args.compare_engines:
+        compare_text_engines(args.pdf_file)
+        return
+    
     # Create extractor
-    extractor = EnhancedPDFFieldExtractor(args.pdf_file)
+    try:
+        pages = parse_page_ranges(args.pages) if args.pages else None
+        extractor = EnhancedPDFFieldExtractor(args.pdf_file, text_engine=args.text_engine, workers=args.workers,
+                                              pages=pages, field_pattern=args.fields, from_mmap=args.mmap,
+                                              collect_geometry=not args.no_geometry,
+                                              widget_scanner=args.widget_scanner, tables=args.tables,
+                                              recover_glyphs=not args.no_glyph_recovery,
+                                              cache_dir=args.cache_dir, cache_glyphs=not args.no_cache)
+    except (ValueError, re.error) as e:
+        print(f"Error: {e}")
+        return
+    
+    # Resolve the output path up front so a previous output is read before it is replaced
+    suffix = '_fields_enhanced.jsonl' if args.format == 'jsonl' else '_fields_enhanced.json'
+    output_path = args.output or Path(args.pdf_file).stem + suffix
+    
+    if args.incremental and extractor.load_previous_output(output_path):
+        print(f"Reusing context for unchanged pages from: {output_path}")
+    
+    # Extract fields with context, reusing cached results for unchanged PDFs
+    if args.no_cache:
+        cache = None
+        records = extractor.iter_fields_with_context()
+    else:
+        cache = ExtractionCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+        records = extractor.iter_fields_cached(cache)
+    
+    if args.format == 'jsonl':
+        if extractor.save_results_jsonl(records, output_path):
+            if args.incremental:
+                extractor.save_page_hashes(output_path)
+            if not args.no_geometry:
+                with open(output_path, 'r', encoding='utf-8') as f:
+                    extractor.save_geometry(output_path, [json.loads(line) for line in f], cache)
+            if args.print:
+                with open(output_path, 'r', encoding='utf-8') as f:
+                    extractor.print_results(json.loads(line) for line in f)
+        else:
+            print("No fields extracted")
+        return
     
-    # Extract fields with context
-    results = extractor.extract_all_fields_with_enhanced_context()
+    results = list(records)
     
     if results:
         # Save results
-        extractor.save_results(results, args.output)
+        extractor.save_results(results, output_path)
+        if args.incremental:
+            extractor.save_page_hashes(output_path)
+        if not args.no_geometry:
+            extractor.save_geometry(output_path, results, cache)
         
         # Print if requested
         if args.print:
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Extraction Cache
+Content-addressed on-disk cache for field extraction results
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+
+class ExtractionCache:
+    """
+    Stores extraction results keyed by the SHA-256 of the PDF bytes plus the
+    extractor version and parameters. Entries are evicted least recently used
+    first once the cache grows past its size cap.
+    """
+
+    DEFAULT_DIR = Path.home() / '.cache' / 'pdf-field-extractor'
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+    ENTRY_SUFFIX = '.jsonl'
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else self.DEFAULT_DIR
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def hash_file(pdf_path: str) -> str:
+        """SHA-256 of the file contents, read in chunks"""
+        digest = hashlib.sha256()
+        with open(pdf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def hash_source(cls, pdf: Union[str, bytes, bytearray, memoryview]) -> str:
+        """SHA-256 of a PDF given as a path or as an in-memory (or memory-mapped) buffer"""
+        if isinstance(pdf, (str, os.PathLike)):
+            return cls.hash_file(pdf)
+        return hashlib.sha256(pdf).hexdigest()
+
+    @classmethod
+    def make_key(cls, pdf: Union[str, bytes, bytearray, memoryview], version: str, params: Dict) -> str:
+        """Cache key for one PDF, by path or buffer, under a given extractor version and parameters"""
+        material = json.dumps({
+            'pdf_sha256': cls.hash_source(pdf),
+            'version': version,
+            'params': params
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / (key + self.ENTRY_SUFFIX)
+
+    def has(self, key: str) -> bool:
+        """Whether an entry exists for a key"""
+        return self._entry_path(key).exists()
+
+    def iter_records(self, key: str) -> Iterator[Dict]:
+        """Stream the cached records for a key and mark the entry as recently used"""
+        entry_path = self._entry_path(key)
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        with open(entry_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Return the cached records for a key, or None on a miss"""
+        try:
+            return list(self.iter_records(key))
+        except (OSError, ValueError):
+            return None
+
+    def record(self, key: str, records: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Pass records through while writing them to the cache
+
+        The entry is committed only once the records are exhausted and at least
+        one was seen, so interrupted or empty extractions are never cached.
+        """
+        entry_path = self._entry_path(key)
+        temp_path = entry_path.with_name(entry_path.name + f'.{os.getpid()}.tmp')
+        count = 0
+
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    count += 1
+                    yield record
+
+            if count:
+                # Atomic so concurrent readers never see a partial entry
+                os.replace(temp_path, entry_path)
+                self.evict()
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def put(self, key: str, records: List[Dict]):
+        """Store records for a key, then enforce the size cap"""
+        for _ in self.record(key, records):
+            pass
+
+    def companion_path(self, key: str, suffix: str) -> Path:
+        """Path of a file kept alongside a key's entry, such as its page geometry sidecar"""
+        return self.cache_dir / (key + suffix)
+
+    def put_companion(self, key: str, suffix: str, source_path: str):
+        """Copy a file in alongside an existing entry; it is evicted and cleared with the entry"""
+        if not self.has(key):
+            return
+        companion_path = self.companion_path(key, suffix)
+        temp_path = companion_path.with_name(companion_path.name + f'.{os.getpid()}.tmp')
+        try:
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, companion_path)
+        except OSError:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def _entry_files(self) -> Dict[str, List[Path]]:
+        """Files in the cache directory by key, the entry itself first when it exists"""
+        files = {}
+        for path in self.cache_dir.iterdir():
+            if not path.is_file() or path.name.endswith('.tmp'):
+                continue
+            key = path.name.split('.', 1)[0]
+            if path.name == key + self.ENTRY_SUFFIX:
+                files.setdefault(key, []).insert(0, path)
+            else:
+                files.setdefault(key, []).append(path)
+        return files
+
+    def evict(self):
+        """Remove least recently used entries, with their companions, until the cache fits its size cap"""
+        entries = []
+        for key, paths in self._entry_files().items():
+            try:
+                stats = [path.stat() for path in paths]
+            except OSError:
+                continue
+            # Companions whose entry is gone go first
+            mtime = stats[0].st_mtime if paths[0].name == key + self.ENTRY_SUFFIX else 0
+            entries.append((mtime, sum(stat.st_size for stat in stats), paths))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for mtime, size, paths in sorted(entries, key=lambda entry: entry[0]):
+            if total_bytes <= self.max_bytes and mtime:
+                break
+            try:
+                for path in paths:
+                    path.unlink()
+                total_bytes -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove every cache entry and its companions"""
+        for paths in self._entry_files().values():
+            for path in paths:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
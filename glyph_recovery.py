@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Glyph Recovery
+Turns the "(cid:NN)" placeholders pdfplumber emits for fonts without a usable
+ToUnicode map back into characters, learning one cid -> character map per font
+program and caching it by font hash so each font is worked out once per corpus
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from extraction_cache import ExtractionCache
+
+
+# pdfplumber's placeholder for a character code it could not map to Unicode
+CID_PATTERN = re.compile(r'^\(cid:(\d+)\)$')
+
+# Glyph names in an /Encoding /Differences array, with their character codes
+DIFFERENCES_TOKEN = re.compile(r'(\d+)|/([^\s/\[\]<>()]+)')
+
+# Subset fonts are named ABCDEF+RealName
+SUBSET_PREFIX = re.compile(r'^[A-Z]{6}\+')
+
+
+def glyph_name_char(name: str) -> Optional[str]:
+    """Character for a glyph name (AGL names, uniXXXX and uXXXX forms), or None"""
+    from pdfminer.encodingdb import name2unicode
+
+    try:
+        char = name2unicode(name)
+    except (KeyError, ValueError):
+        import fitz  # PyMuPDF
+        code = fitz.glyph_name_to_unicode(name)
+        char = chr(code) if code and code != 0xFFFD else None
+    return char if char and char.isprintable() else None
+
+
+def has_cid_chars(chars: List[Dict]) -> bool:
+    """Whether any of a page's chars is a "(cid:NN)" placeholder"""
+    return any(char['text'].startswith('(cid:') for char in chars)
+
+
+class GlyphMapCache:
+    """
+    cid -> character maps by font hash, kept in memory for the process and as
+    one small JSON file per font on disk
+
+    Maps live in the "glyphs" directory of the extraction cache. Files carry
+    MAP_VERSION in their name, so bumping it discards every map learned
+    before. With persist=False nothing is read from or written to disk, and
+    maps are only shared within this cache object.
+    """
+
+    SUBDIR = 'glyphs'
+
+    # Bumped whenever the way maps are learned changes
+    MAP_VERSION = 1
+
+    # Shared by every persistent cache in the process, so workers and sessions learn together
+    _memory = {}
+
+    def __init__(self, cache_dir: Optional[str] = None, persist: bool = True):
+        self.cache_dir = (Path(cache_dir) if cache_dir else ExtractionCache.DEFAULT_DIR) / self.SUBDIR
+        self.persist = persist
+        if not persist:
+            self._memory = {}
+
+    def _entry_path(self, font_hash: str) -> Path:
+        return self.cache_dir / f"{font_hash}.v{self.MAP_VERSION}.json"
+
+    def get(self, font_hash: str) -> Optional[Dict[int, str]]:
+        """The map stored for a font, or None if it has not been learned yet"""
+        if font_hash in self._memory:
+            return self._memory[font_hash]
+        if not self.persist:
+            return None
+        try:
+            with open(self._entry_path(font_hash), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get('version') != self.MAP_VERSION:
+                return None
+            cid_map = {int(cid): char for cid, char in entry['cids'].items()}
+        except (OSError, ValueError, KeyError, AttributeError):
+            return None
+        self._memory[font_hash] = cid_map
+        return cid_map
+
+    def put(self, font_hash: str, cid_map: Dict[int, str]):
+        """Store a font's map; an unwritable cache directory only loses the disk copy"""
+        self._memory[font_hash] = cid_map
+        if not self.persist:
+            return
+        entry_path = self._entry_path(font_hash)
+        temp_path = entry_path.with_name(entry_path.name + f'.{os.getpid()}.tmp')
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.MAP_VERSION,
+                           'cids': {str(cid): char for cid, char in sorted(cid_map.items())}}, f,
+                          ensure_ascii=False)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            if temp_path.exists():
+                temp_path.unlink()
+
+
+class GlyphRecovery:
+    """
+    Repairs "(cid:NN)" chars of pdfplumber pages of one document
+
+    Each font's map is built from two sources. PyMuPDF's own decoding of the
+    same characters, matched by position, is used wherever it yields a real
+    character; MuPDF knows the built-in CJK orderings and more glyph names
+    than pdfminer. Codes it cannot decode (it echoes the cid itself) fall back
+    to the font program: glyph names from /Differences for simple fonts, and
+    the embedded TrueType program's own cmap, inverted from glyph id to
+    character, for CID fonts. Once a font's map is cached, PyMuPDF is only
+    consulted for codes the map lacks. Chars are fixed in place, so words,
+    tokens and lines built from the page afterwards all read the recovered text.
+    """
+
+    def __init__(self, fitz_doc, cache: Optional[GlyphMapCache] = None):
+        self.fitz_doc = fitz_doc
+        self.cache = cache or GlyphMapCache()
+        # Font xref -> font hash, and font hash -> cid map, for this document
+        self._font_hashes = {}
+        self._maps = {}
+        # Font hash -> map from the font program, for fonts the cache did not know yet
+        self._program_maps = {}
+
+    def repair_page(self, plumber_page, page_num: int) -> int:
+        """Replace the cid placeholders among a page's chars, returning how many were recovered"""
+        pending = []
+        for char in plumber_page.chars:
+            match = CID_PATTERN.match(char['text'])
+            if match:
+                pending.append((char, int(match.group(1))))
+        if not pending:
+            return 0
+
+        fitz_page = self.fitz_doc[page_num]
+        xrefs_by_name = {}
+        for xref, _, _, basefont, *_ in fitz_page.get_fonts(full=True):
+            xrefs_by_name.setdefault(basefont, xref)
+            xrefs_by_name.setdefault(SUBSET_PREFIX.sub('', basefont), xref)
+
+        # A font seen for the first time is decoded by PyMuPDF in full; a known
+        # font only sends the codes its cached map is missing
+        resolved = []
+        unresolved = []
+        for char, cid in pending:
+            fontname = char.get('fontname', '')
+            xref = xrefs_by_name.get(fontname) or xrefs_by_name.get(SUBSET_PREFIX.sub('', fontname))
+            if xref is None:
+                continue
+            font_hash = self._font_hash(xref)
+            resolved.append((char, cid, font_hash))
+            if font_hash in self._program_maps or cid not in self._maps[font_hash]:
+                unresolved.append((char, cid, font_hash))
+
+        # Every code already has a cached character, so PyMuPDF is not consulted
+        decoded_chars = self._decode_with_fitz(fitz_page, unresolved) if unresolved else []
+        learned = set()
+        for (char, cid, font_hash), decoded in zip(unresolved, decoded_chars):
+            # MuPDF echoes the cid as the character when it cannot decode it either
+            if decoded is not None and decoded != chr(cid):
+                self._maps[font_hash][cid] = decoded
+                learned.add(font_hash)
+
+        # The font program fills in whatever PyMuPDF could not decode
+        for font_hash in {font_hash for _, _, font_hash in unresolved if font_hash in self._program_maps}:
+            for cid, char in self._program_maps.pop(font_hash).items():
+                self._maps[font_hash].setdefault(cid, char)
+            learned.add(font_hash)
+        for font_hash in learned:
+            self.cache.put(font_hash, self._maps[font_hash])
+
+        recovered = 0
+        for char, cid, font_hash in resolved:
+            if cid in self._maps[font_hash]:
+                char['text'] = self._maps[font_hash][cid]
+                recovered += 1
+        return recovered
+
+    def _font_hash(self, xref: int) -> str:
+        """
+        Hash of a font's program and encoding, loading its learned map
+
+        Fonts the cache does not know yet also get a map built from their glyph
+        names and embedded cmap, merged in after PyMuPDF's pass over their first page.
+        """
+        if xref in self._font_hashes:
+            return self._font_hashes[xref]
+
+        doc = self.fitz_doc
+        program = doc.extract_font(xref)[3] or b''
+        descendant = self._descendant(xref)
+        subtype = doc.xref_get_key(descendant or xref, 'Subtype')[1]
+        cid_to_gid = doc.xref_get_key(descendant, 'CIDToGIDMap') if descendant else ('null', 'null')
+        gid_map = doc.xref_stream(int(cid_to_gid[1].split()[0])) if cid_to_gid[0] == 'xref' else b''
+        differences = doc.xref_get_key(xref, 'Encoding/Differences')[1] if descendant is None else ''
+
+        # The same program under another encoding decodes differently, so both go into the hash
+        digest = hashlib.sha256(program or doc.xref_object(xref).encode('utf-8'))
+        for part in (subtype.encode('ascii', 'replace'), gid_map, differences.encode('utf-8', 'replace')):
+            digest.update(b'\0' + part)
+        font_hash = digest.hexdigest()
+        self._font_hashes[xref] = font_hash
+
+        if font_hash not in self._maps:
+            cid_map = self.cache.get(font_hash)
+            if cid_map is None:
+                program_map = {}
+                if differences not in ('', 'null'):
+                    program_map.update(self._differences_map(differences))
+                if descendant and subtype == '/CIDFontType2' and program:
+                    program_map.update(self._program_map(program, gid_map))
+                self._program_maps[font_hash] = program_map
+            self._maps[font_hash] = cid_map if cid_map is not None else {}
+        return font_hash
+
+    def _descendant(self, xref: int) -> Optional[int]:
+        """The CIDFont of a Type0 font, or None for simple fonts"""
+        kind, value = self.fitz_doc.xref_get_key(xref, 'DescendantFonts')
+        match = re.search(r'(\d+) 0 R', value) if kind in ('array', 'xref') else None
+        if match and kind == 'xref':
+            match = re.search(r'(\d+) 0 R', self.fitz_doc.xref_object(int(match.group(1))))
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def _differences_map(differences: str) -> Dict[int, str]:
+        """Character codes named in an /Encoding /Differences array"""
+        cid_map = {}
+        code = 0
+        for number, name in DIFFERENCES_TOKEN.findall(differences):
+            if number:
+                code = int(number)
+                continue
+            name = re.sub(r'#([0-9A-Fa-f]{2})', lambda m: chr(int(m.group(1), 16)), name)
+            char = glyph_name_char(name)
+            if char:
+                cid_map[code] = char
+            code += 1
+        return cid_map
+
+    @staticmethod
+    def _program_map(program: bytes, gid_map: bytes) -> Dict[int, str]:
+        """cid -> character from an embedded TrueType program's cmap, through CIDToGIDMap"""
+        import fitz  # PyMuPDF
+
+        try:
+            font = fitz.Font(fontbuffer=program)
+        except (RuntimeError, ValueError):
+            return {}
+
+        # Lowest code point per glyph, so a space wins over a no-break space
+        by_gid = {}
+        for code in sorted(font.valid_codepoints()):
+            gid = font.has_glyph(code)
+            if gid and chr(code).isprintable():
+                by_gid.setdefault(gid, chr(code))
+
+        if not gid_map:
+            return by_gid
+        # A CIDToGIDMap stream holds one big-endian glyph id per cid
+        cid_map = {}
+        for cid in range(len(gid_map) // 2):
+            gid = int.from_bytes(gid_map[2 * cid:2 * cid + 2], 'big')
+            if gid in by_gid:
+                cid_map[cid] = by_gid[gid]
+        return cid_map
+
+    @staticmethod
+    def _decode_with_fitz(fitz_page, unresolved: List) -> List[Optional[str]]:
+        """PyMuPDF's character at the position of each unresolved pdfplumber char"""
+        import fitz  # PyMuPDF
+
+        # PyMuPDF chars are unrotated and relative to the cropbox; pdfplumber's are
+        # relative to the mediabox after the page's rotation
+        rotate = fitz.Matrix(fitz_page.rotation)
+        rotated = fitz.Rect(0, 0, fitz_page.mediabox.width, fitz_page.mediabox.height) * rotate
+        to_plumber = (fitz.Matrix(1, 0, 0, 1, fitz_page.cropbox.x0, fitz_page.cropbox.y0) * rotate
+                      * fitz.Matrix(1, 0, 0, 1, -rotated.x0, -rotated.y0))
+
+        buckets = {}
+        for block in fitz_page.get_text('rawdict').get('blocks', []):
+            for line in block.get('lines', []):
+                for span in line.get('spans', []):
+                    for char in span.get('chars', []):
+                        box = fitz.Rect(char['bbox']) * to_plumber
+                        center = (box.tl + box.br) * 0.5
+                        buckets.setdefault(int(center.x), []).append((center, char['c']))
+
+        decoded = []
+        for char, *_ in unresolved:
+            x = (char['x0'] + char['x1']) / 2
+            y = (char['top'] + char['bottom']) / 2
+            best = None
+            for bucket in (int(x) - 1, int(x), int(x) + 1):
+                for center, c in buckets.get(bucket, []):
+                    dx, dy = abs(center.x - x), abs(center.y - y)
+                    if dx <= 1.5 and dy <= (char['bottom'] - char['top']) / 2 and (best is None or dx + dy < best[0]):
+                        best = (dx + dy, c)
+            c = best[1] if best else None
+            decoded.append(c if c and c != '\ufffd' and c.isprintable() else None)
+        return decoded
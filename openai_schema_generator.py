@@ -275,12 +275,17 @@ Example response for a checkbox field:
         if screenshot_size > 5500000:  # ~4MB after base64 encoding
             print(f"Warning: Screenshot for {field_name} is {screenshot_size/1024/1024:.1f}MB (base64), may be too large")
         
+        # Section headings from the extraction give the field's topic without a full-page image
+        user_text = f"Analyze this PDF form field '{field_name}' (highlighted in red rectangle) and generate a complete schema item definition. The field type is: {field_type}"
+        if field_data.get('section_path'):
+            user_text += f"\nThe field is in the form section: {' > '.join(field_data['section_path'])}"
+        
         user_message = {
             "role": "user",
             "content": [
                 {
                     "type": "text",
-                    "text": f"Analyze this PDF form field '{field_name}' (highlighted in red rectangle) and generate a complete schema item definition. The field type is: {field_type}"
+                    "text": user_text
                 },
                 {
                     "type": "image_url",
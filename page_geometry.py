@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Page Geometry Sidecar
+Compact binary page sizes, word boxes, text lines and widget boxes written next
+to the extraction output, so later stages can read page text without parsing the PDF again
+"""
+
+import os
+import struct
+import zipfile
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from page_text_model import PageTextModel
+
+
+# Sidecar file name: <output path> + suffix
+GEOMETRY_SUFFIX = '.geometry.npz'
+
+# Bumped when the array layout changes
+GEOMETRY_FORMAT = 1
+
+
+def pack_page(words: List[Dict], lines: List[Dict]) -> Dict:
+    """Compact, picklable geometry of one page's words and text lines"""
+    return {
+        'word_boxes': np.array([[w['x0'], w['y0'], w['x1'], w['y1']] for w in words],
+                               dtype=np.float32).reshape(-1, 4),
+        'word_texts': [w['text'] for w in words],
+        'line_boxes': np.array([[l['x0'], l['y0'], l['x1'], l['y1']] for l in lines],
+                               dtype=np.float32).reshape(-1, 4),
+        'line_texts': [l['text'] for l in lines],
+        'line_sizes': np.array([l.get('size', 0) for l in lines], dtype=np.float32)
+    }
+
+
+def _pack_strings(strings: List[str]):
+    """UTF-8 blob plus offsets, so string i is blob[offsets[i]:offsets[i + 1]]"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _page_offsets(counts: List[int]):
+    """CSR-style offsets so page p's rows are [offsets[p], offsets[p + 1])"""
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def write_geometry(path: str, page_sizes: List[List[float]], pages: Dict[int, Dict], records: Iterable[Dict],
+                   source_key: str = ''):
+    """
+    Write the sidecar as an uncompressed .npz so every array can be memory-mapped
+
+    pages maps page numbers to pack_page() output; records are the extraction
+    output records, whose order gives each widget's record index. source_key
+    identifies the PDF and options the sidecar was built from.
+    """
+    page_count = len(page_sizes)
+    empty = pack_page([], [])
+    packed = [pages.get(page_num, empty) for page_num in range(page_count)]
+
+    widgets = [[] for _ in range(page_count)]
+    for index, record in enumerate(records):
+        page_num = record.get('page')
+        if page_num is not None and record.get('position') and 0 <= page_num < page_count:
+            widgets[page_num].append((record['position'], record['field_name'], index))
+
+    word_text, word_text_offsets = _pack_strings([t for p in packed for t in p['word_texts']])
+    line_text, line_text_offsets = _pack_strings([t for p in packed for t in p['line_texts']])
+    widget_name, widget_name_offsets = _pack_strings([name for page in widgets for _, name, _ in page])
+
+    arrays = {
+        'format': np.array([GEOMETRY_FORMAT], dtype=np.int32),
+        'source_key': np.frombuffer(source_key.encode('ascii'), dtype=np.uint8),
+        'page_sizes': np.array(page_sizes, dtype=np.float64).reshape(-1, 2),
+        'word_offsets': _page_offsets([len(p['word_texts']) for p in packed]),
+        'word_boxes': np.concatenate([p['word_boxes'] for p in packed]) if packed else empty['word_boxes'],
+        'word_text': word_text,
+        'word_text_offsets': word_text_offsets,
+        'line_offsets': _page_offsets([len(p['line_texts']) for p in packed]),
+        'line_boxes': np.concatenate([p['line_boxes'] for p in packed]) if packed else empty['line_boxes'],
+        'line_sizes': np.concatenate([p['line_sizes'] for p in packed]) if packed else empty['line_sizes'],
+        'line_text': line_text,
+        'line_text_offsets': line_text_offsets,
+        'widget_offsets': _page_offsets([len(page) for page in widgets]),
+        'widget_boxes': np.array([box for page in widgets for box, _, _ in page], dtype=np.float64).reshape(-1, 4),
+        'widget_name': widget_name,
+        'widget_name_offsets': widget_name_offsets,
+        'widget_records': np.array([index for page in widgets for _, _, index in page], dtype=np.int64)
+    }
+
+    # np.savez stores members uncompressed, which is what makes them mappable. Replacing
+    # the file rather than rewriting it leaves readers of the old sidecar intact
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def memmap_npz(path: str) -> Dict[str, np.ndarray]:
+    """Memory-map every member of an uncompressed .npz by its offset in the zip file"""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed and cannot be memory-mapped")
+
+            # Local file header: fixed 30 bytes, then the name and extra field
+            f.seek(info.header_offset)
+            header = f.read(30)
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+class PageGeometry:
+    """
+    Read-only view of a geometry sidecar
+
+    Arrays are memory-mapped, so loading is constant time and pages are only
+    read from disk when they are accessed.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        if int(arrays['format'][0]) != GEOMETRY_FORMAT:
+            raise ValueError(f"Unsupported geometry format {int(arrays['format'][0])}")
+        self.arrays = arrays
+        self._models = {}
+
+    @classmethod
+    def load(cls, path: str) -> 'PageGeometry':
+        """Memory-map a sidecar written by write_geometry()"""
+        return cls(memmap_npz(path))
+
+    @classmethod
+    def for_output(cls, output_path: str) -> Optional['PageGeometry']:
+        """Load the sidecar next to an extraction output, or None if there is none"""
+        try:
+            return cls.load(str(output_path) + GEOMETRY_SUFFIX)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+    @property
+    def source_key(self) -> str:
+        """Extraction key of the PDF and options the sidecar was built from"""
+        return bytes(self.arrays['source_key']).decode('ascii')
+
+    @property
+    def page_count(self) -> int:
+        return len(self.arrays['page_sizes'])
+
+    def page_size(self, page_num: int):
+        """(width, height) of a page in points"""
+        width, height = self.arrays['page_sizes'][page_num]
+        return float(width), float(height)
+
+    def _rows(self, kind: str, page_num: int) -> slice:
+        offsets = self.arrays[kind + '_offsets']
+        return slice(int(offsets[page_num]), int(offsets[page_num + 1]))
+
+    def _strings(self, blob: str, rows: slice) -> List[str]:
+        data = self.arrays[blob]
+        offsets = self.arrays[blob + '_offsets']
+        return [bytes(data[offsets[i]:offsets[i + 1]]).decode('utf-8') for i in range(rows.start, rows.stop)]
+
+    def word_boxes(self, page_num: int) -> np.ndarray:
+        """(n, 4) word boxes of a page, x0 y0 x1 y1 in top-left coordinates"""
+        return self.arrays['word_boxes'][self._rows('word', page_num)]
+
+    def word_texts(self, page_num: int) -> List[str]:
+        return self._strings('word_text', self._rows('word', page_num))
+
+    def line_boxes(self, page_num: int) -> np.ndarray:
+        """(n, 4) text line boxes of a page, sorted top to bottom"""
+        return self.arrays['line_boxes'][self._rows('line', page_num)]
+
+    def line_texts(self, page_num: int) -> List[str]:
+        return self._strings('line_text', self._rows('line', page_num))
+
+    def widget_boxes(self, page_num: int) -> np.ndarray:
+        """(n, 4) widget boxes of a page"""
+        return self.arrays['widget_boxes'][self._rows('widget', page_num)]
+
+    def widget_names(self, page_num: int) -> List[str]:
+        return self._strings('widget_name', self._rows('widget', page_num))
+
+    def widget_records(self, page_num: int) -> np.ndarray:
+        """Index of each of the page's widgets in the extraction output"""
+        return self.arrays['widget_records'][self._rows('widget', page_num)]
+
+    def packed_page(self, page_num: int) -> Dict:
+        """A page's words and lines in pack_page() form, copied out of the mapping"""
+        line_rows = self._rows('line', page_num)
+        return {
+            'word_boxes': np.array(self.word_boxes(page_num), dtype=np.float32).reshape(-1, 4),
+            'word_texts': self.word_texts(page_num),
+            'line_boxes': np.array(self.line_boxes(page_num), dtype=np.float32).reshape(-1, 4),
+            'line_texts': self.line_texts(page_num),
+            'line_sizes': np.array(self.arrays['line_sizes'][line_rows], dtype=np.float32)
+        }
+
+    def text_model(self, page_num: int) -> Optional[PageTextModel]:
+        """A PageTextModel of the page's words and lines (chars are not stored)"""
+        if not 0 <= page_num < self.page_count:
+            return None
+        if page_num in self._models:
+            return self._models[page_num]
+
+        width, height = self.page_size(page_num)
+        words = [{'text': text, 'x0': float(x0), 'y0': float(y0), 'x1': float(x1), 'y1': float(y1),
+                  'fontname': '', 'size': 0}
+                 for text, (x0, y0, x1, y1) in zip(self.word_texts(page_num), self.word_boxes(page_num))]
+        line_rows = self._rows('line', page_num)
+        lines = [{'text': text, 'x0': float(x0), 'y0': float(y0), 'x1': float(x1), 'y1': float(y1),
+                  'fontname': '', 'size': float(size)}
+                 for text, (x0, y0, x1, y1), size in zip(self.line_texts(page_num), self.line_boxes(page_num),
+                                                         self.arrays['line_sizes'][line_rows])]
+        tokens = [{'text': w['text'], 'x0': w['x0'], 'top': w['y0'], 'x1': w['x1'], 'bottom': w['y1']}
+                  for w in words]
+        model = PageTextModel(page_num, width, height, words, lambda: [], tokens=tokens, lines=lines)
+        self._models[page_num] = model
+        return model
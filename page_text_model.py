@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Page Text Model
+Per-page chars -> words -> lines with bounding boxes and font info, built once
+per page and shared by the extractors and downstream grouping stages
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, List, Optional
+
+
+# Characters whose tops differ by less than this belong to the same line
+LINE_TOLERANCE = 2
+
+
+def group_chars_into_lines(chars: List[Dict]) -> List[Dict]:
+    """
+    Group characters into text lines with a sort-and-sweep over y
+
+    Characters are sorted once by (top, x0) and swept in order; a new line
+    starts whenever a character's top moves LINE_TOLERANCE or more away from
+    the previous character's top. Linear after the sort.
+    """
+    lines = []
+    current_line = []
+    last_y = None
+
+    for char in sorted(chars, key=lambda c: (c['top'], c['x0'])):
+        if last_y is None or abs(char['top'] - last_y) < LINE_TOLERANCE:
+            current_line.append(char)
+        else:
+            if current_line:
+                lines.append(current_line)
+            current_line = [char]
+        last_y = char['top']
+
+    if current_line:
+        lines.append(current_line)
+
+    text_lines = []
+    for line in lines:
+        sizes = [c.get('size', 0) for c in line]
+        largest = line[sizes.index(max(sizes))]
+        text_lines.append({
+            'text': ''.join(c['text'] for c in line).strip(),
+            'x0': min(c['x0'] for c in line),
+            'y0': min(c['top'] for c in line),
+            'x1': max(c['x1'] for c in line),
+            'y1': max(c['bottom'] for c in line),
+            'fontname': largest.get('fontname', ''),
+            'size': largest.get('size', 0)
+        })
+
+    return text_lines
+
+
+class PageTextModel:
+    """
+    Text of one page at three levels: chars, words and lines
+
+    Words use the extractor's element format (text, x0, y0, x1, y1, fontname,
+    size) in top-left page coordinates. Lines are sorted top to bottom. Chars
+    and lines are only loaded when first read, while the owning document is open.
+    """
+
+    def __init__(self, page_num: int, width: float, height: float, words: List[Dict],
+                 load_chars: Callable[[], List[Dict]], tokens: Optional[List[Dict]] = None,
+                 lines: Optional[List[Dict]] = None):
+        self.page_num = page_num
+        self.width = width
+        self.height = height
+        self.words = words
+        self._load_chars = load_chars
+        self._chars = None
+        self._lines = lines
+        self._line_tops = [line['y0'] for line in lines] if lines is not None else None
+        self._tokens = tokens
+        self._plumber_page = None
+
+    @classmethod
+    def from_plumber_page(cls, page, page_num: int) -> 'PageTextModel':
+        """Build from a pdfplumber page"""
+        words = [{
+            'text': word['text'],
+            'x0': word['x0'],
+            'y0': word['top'],
+            'x1': word['x1'],
+            'y1': word['bottom'],
+            'fontname': word.get('fontname', ''),
+            'size': word.get('size', 0)
+        } for word in page.extract_words(
+            keep_blank_chars=True,
+            x_tolerance=3,
+            y_tolerance=3,
+            extra_attrs=['fontname', 'size']
+        )]
+
+        model = cls(page_num, float(page.width), float(page.height), words, lambda: list(page.chars))
+        model._plumber_page = page
+        return model
+
+    @classmethod
+    def from_fitz_page(cls, page, page_num: int) -> 'PageTextModel':
+        """Build from a PyMuPDF page"""
+        words = [{
+            'text': text,
+            'x0': x0,
+            'y0': y0,
+            'x1': x1,
+            'y1': y1,
+            'fontname': '',
+            'size': 0
+        } for x0, y0, x1, y1, text, *_ in page.get_text("words")]
+
+        def load_chars():
+            # Characters with font info from the raw text dictionary
+            chars = []
+            for block in page.get_text("rawdict").get('blocks', []):
+                for line in block.get('lines', []):
+                    for span in line.get('spans', []):
+                        for char in span.get('chars', []):
+                            x0, top, x1, bottom = char['bbox']
+                            chars.append({
+                                'text': char['c'],
+                                'x0': x0,
+                                'top': top,
+                                'x1': x1,
+                                'bottom': bottom,
+                                'fontname': span.get('font', ''),
+                                'size': span.get('size', 0)
+                            })
+            return chars
+
+        tokens = [{'text': w['text'], 'x0': w['x0'], 'top': w['y0'], 'x1': w['x1'], 'bottom': w['y1']}
+                  for w in words]
+        return cls(page_num, page.rect.width, page.rect.height, words, load_chars, tokens=tokens)
+
+    @property
+    def chars(self) -> List[Dict]:
+        """Characters in pdfplumber's format (text, x0, top, x1, bottom, fontname, size)"""
+        if self._chars is None:
+            self._chars = self._load_chars()
+            self._load_chars = None
+        return self._chars
+
+    @property
+    def lines(self) -> List[Dict]:
+        """Text lines (text, x0, y0, x1, y1, fontname, size) sorted top to bottom"""
+        if self._lines is None:
+            self._lines = group_chars_into_lines(self.chars)
+            self._line_tops = [line['y0'] for line in self._lines]
+        return self._lines
+
+    @property
+    def tokens(self) -> List[Dict]:
+        """Whitespace-separated words in pdfplumber's format (text, x0, top, x1, bottom)"""
+        if self._tokens is None:
+            self._tokens = self._plumber_page.extract_words()
+            self._plumber_page = None
+        return self._tokens
+
+    def lines_between(self, y0: float, y1: float) -> List[Dict]:
+        """Lines whose top lies in [y0, y1], found by bisecting the sorted tops"""
+        lines = self.lines
+        return lines[bisect_left(self._line_tops, y0):bisect_right(self._line_tops, y1)]
+
+    def label_for(self, rect: List[float], max_above: float = 40) -> str:
+        """
+        Text labelling a field: the line it sits on, left of the field, or else
+        the nearest line just above it
+        """
+        x0, y0, x1, y1 = rect
+        center_y = (y0 + y1) / 2
+
+        # A line on the field's row that starts left of the field
+        for line in self.lines_between(y0 - 20, y1):
+            if line['y0'] <= center_y <= line['y1'] and line['x0'] < x0:
+                return line['text']
+
+        # Otherwise the closest line above that overlaps the field horizontally
+        for line in reversed(self.lines_between(y0 - max_above - 20, y0)):
+            if line['y1'] <= y0 and line['x1'] > x0 - 100 and line['x0'] < x1:
+                return line['text']
+
+        return ''
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+PDF Document Session
+Keeps one pdfplumber handle and one PyMuPDF handle open for a whole extraction run
+"""
+
+import io
+import mmap
+import os
+from collections import OrderedDict
+from typing import BinaryIO, Optional, Union
+
+
+# A PDF given as a filesystem path, an in-memory buffer or a readable binary file
+PDFSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file over a bytes-like buffer that never copies the whole buffer"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        count = max(0, min(len(b), len(self._view) - self._pos))
+        b[:count] = self._view[self._pos:self._pos + count]
+        self._pos += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class PDFDocumentSession:
+    """
+    Lazily opened, shared document handles for a single PDF
+
+    Handles are opened on first use and reused by every page lookup until the
+    session is closed. The session is re-entrant: nested ``with`` blocks keep
+    the handles open and only the outermost block closes them.
+
+    The PDF may be a path, an in-memory buffer (bytes, bytearray, memoryview)
+    or a readable binary file. Buffers are shared with both libraries without
+    copying; a file object is read once. With ``from_mmap`` a path is memory
+    mapped instead of being opened by each library. With ``recover_glyphs``
+    pdfplumber's "(cid:NN)" placeholders are decoded before text models are built;
+    the fonts' learned maps are cached under ``cache_dir`` (the extraction
+    cache directory by default) unless ``cache_glyphs`` is False.
+    """
+
+    TEXT_MODEL_CACHE_SIZE = 16
+
+    def __init__(self, source: PDFSource, from_mmap: bool = False, recover_glyphs: bool = True,
+                 cache_dir: Optional[str] = None, cache_glyphs: bool = True):
+        if isinstance(source, (str, os.PathLike)):
+            self.pdf_path = os.fspath(source)
+            self._data = None
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            self.pdf_path = None
+            self._data = source
+        elif hasattr(source, 'read'):
+            self.pdf_path = None
+            self._data = source.read()
+        else:
+            raise TypeError(f"Unsupported PDF source: {type(source).__name__}")
+
+        # Stem for naming output files; unnamed in-memory sources get a generic one
+        name = self.pdf_path or getattr(source, 'name', None)
+        self.stem = os.path.splitext(os.path.basename(name))[0] if isinstance(name, str) else 'document'
+
+        self.from_mmap = from_mmap and self.pdf_path is not None
+        self.recover_glyphs = recover_glyphs
+        self.cache_dir = cache_dir
+        self.cache_glyphs = cache_glyphs
+        self._mmap = None
+        self._plumber_reader = None
+        self._plumber_pdf = None
+        self._fitz_doc = None
+        self._text_models = OrderedDict()
+        self._glyph_recovery = None
+        self._depth = 0
+
+    @property
+    def data(self) -> Optional[Union[bytes, bytearray, memoryview, mmap.mmap]]:
+        """The PDF bytes for in-memory and memory-mapped sources, None for plain paths"""
+        if self.from_mmap and self._mmap is None:
+            with open(self.pdf_path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap if self.from_mmap else self._data
+
+    def open_binary(self) -> BinaryIO:
+        """A new readable binary file over the PDF, for readers that take a stream"""
+        if self.data is None:
+            return open(self.pdf_path, 'rb')
+        return BufferReader(self.data)
+
+    @property
+    def plumber_pdf(self):
+        """The shared pdfplumber document"""
+        if self._plumber_pdf is None:
+            import pdfplumber
+            if self.data is None:
+                self._plumber_pdf = pdfplumber.open(self.pdf_path)
+            else:
+                self._plumber_reader = BufferReader(self.data)
+                self._plumber_pdf = pdfplumber.open(self._plumber_reader)
+        return self._plumber_pdf
+
+    @property
+    def fitz_doc(self):
+        """The shared PyMuPDF document"""
+        if self._fitz_doc is None:
+            import fitz  # PyMuPDF
+            if self.data is None:
+                self._fitz_doc = fitz.open(self.pdf_path)
+            else:
+                self._fitz_doc = fitz.open(stream=memoryview(self.data).cast('B'), filetype='pdf')
+        return self._fitz_doc
+
+    def plumber_page(self, page_num: int):
+        """Return a pdfplumber page, or None if the page does not exist"""
+        pages = self.plumber_pdf.pages
+        if 0 <= page_num < len(pages):
+            return pages[page_num]
+        return None
+
+    def text_model(self, page_num: int, engine: str = 'pdfplumber'):
+        """
+        Return the shared PageTextModel for a page, or None if the page does not exist
+
+        Models are built once per page and engine and kept in a small LRU so
+        every stage of a run reads the same chars, words and lines.
+        """
+        from page_text_model import PageTextModel
+
+        key = (page_num, engine)
+        if key in self._text_models:
+            self._text_models.move_to_end(key)
+            return self._text_models[key]
+
+        if engine == 'fitz':
+            if not 0 <= page_num < len(self.fitz_doc):
+                return None
+            model = PageTextModel.from_fitz_page(self.fitz_doc[page_num], page_num)
+        else:
+            page = self.plumber_page(page_num)
+            if page is None:
+                return None
+            if self.recover_glyphs:
+                self.recover_page_glyphs(page, page_num)
+            model = PageTextModel.from_plumber_page(page, page_num)
+
+        self._text_models[key] = model
+        if len(self._text_models) > self.TEXT_MODEL_CACHE_SIZE:
+            self._text_models.popitem(last=False)
+        return model
+
+    def recover_page_glyphs(self, page, page_num: int) -> int:
+        """
+        Decode "(cid:NN)" chars of a pdfplumber page in place, returning how many were recovered
+
+        PyMuPDF is only opened once a page actually has such chars.
+        """
+        from glyph_recovery import GlyphMapCache, GlyphRecovery, has_cid_chars
+
+        if not has_cid_chars(page.chars):
+            return 0
+        if self._glyph_recovery is None:
+            cache = GlyphMapCache(self.cache_dir, persist=self.cache_glyphs)
+            self._glyph_recovery = GlyphRecovery(self.fitz_doc, cache)
+        return self._glyph_recovery.repair_page(page, page_num)
+
+    def close(self):
+        """Close any open handles"""
+        self._text_models.clear()
+        self._glyph_recovery = None
+        if self._plumber_pdf is not None:
+            self._plumber_pdf.close()
+            self._plumber_pdf = None
+        if self._plumber_reader is not None:
+            self._plumber_reader.close()
+            self._plumber_reader = None
+        if self._fitz_doc is not None:
+            self._fitz_doc.close()
+            self._fitz_doc = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # Still exported to a closed document; unmapped once that is collected
+            self._mmap = None
+
+    def __enter__(self):
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._depth -= 1
+        if self._depth <= 0:
+            self._depth = 0
+            self.close()
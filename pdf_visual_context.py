@@ -4,18 +4,128 @@ PDF Visual Context Extractor
 Takes screenshots around form fields with visual indicators
 """
 
-import fitz  # PyMuPDF
 from pathlib import Path
 import base64
+from collections import OrderedDict
 from typing import Dict, List, Tuple, Optional
-import io
+from pdf_session import PDFDocumentSession, PDFSource
+
+
+class HighlightCompositor:
+    """
+    Draws rectangle outlines straight into a rendered pixmap's samples
+    
+    Each outline is four bands of solid color centered on the rect's edges.
+    With NumPy the sample buffer is viewed as a (height, width, channels)
+    array and every band is one slice assignment; without it each band is
+    filled with Pixmap.set_rect. Either way no PDF-level work is done, so
+    any number of highlights costs a few memory writes each.
+    """
+    
+    def __init__(self, color: Tuple[float, float, float] = (1, 0, 0), width: float = 3):
+        # RGB in 0..1 like PyMuPDF drawing colors; width in pixels
+        self.color = tuple(int(round(c * 255)) for c in color)
+        self.width = width
+    
+    def bands(self, rect, bounds) -> List:
+        """Top, bottom, left and right bands of a rect's outline, clipped to bounds (pixel IRects)"""
+        import fitz  # PyMuPDF
+        
+        half = self.width / 2
+        outer = fitz.Rect(rect.x0 - half, rect.y0 - half, rect.x1 + half, rect.y1 + half)
+        inner = fitz.Rect(rect.x0 + half, rect.y0 + half, rect.x1 - half, rect.y1 - half)
+        bands = []
+        for band in (
+            (outer.x0, outer.y0, outer.x1, inner.y0),  # Top
+            (outer.x0, inner.y1, outer.x1, outer.y1),  # Bottom
+            (outer.x0, inner.y0, inner.x0, inner.y1),  # Left
+            (inner.x1, inner.y0, outer.x1, inner.y1)   # Right
+        ):
+            band = fitz.IRect(*(int(round(v)) for v in band)) & bounds
+            if not band.is_empty:
+                bands.append(band)
+        return bands
+    
+    def draw(self, pix, rects: List):
+        """Outline every rect, given in the pixmap's pixel coordinates, on pix in place"""
+        color = self.color + (255,) * pix.alpha
+        bands = [band for rect in rects for band in self.bands(rect, pix.irect)]
+        
+        try:
+            import numpy as np
+        except ImportError:
+            for band in bands:
+                pix.set_rect(band, color)
+            return pix
+        
+        # Rows may be padded past width * n, so view by stride and trim
+        samples = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.h, pix.stride)
+        samples = samples[:, :pix.w * pix.n].reshape(pix.h, pix.w, pix.n)
+        fill = np.array(color, dtype=np.uint8)
+        for band in bands:
+            # Pixmap coordinates start at the crop's origin, not at zero
+            samples[band.y0 - pix.y:band.y1 - pix.y, band.x0 - pix.x:band.x1 - pix.x] = fill
+        return pix
 
 
 class PDFVisualContextExtractor:
-    def __init__(self, pdf_path: str):
-        self.pdf_path = pdf_path
-        self.doc = fitz.open(pdf_path)
+    # Rendered pages kept at once; captures are grouped by page so each page renders once per zoom
+    PAGE_RASTER_CACHE_SIZE = 4
+    
+    def __init__(self, pdf_source: PDFSource, from_mmap: bool = False):
+        # A path, an in-memory buffer or a binary file
+        self.session = PDFDocumentSession(pdf_source, from_mmap=from_mmap)
+        self.pdf_path = self.session.pdf_path
+        self.doc = self.session.fitz_doc
+        # (page, zoom) -> full page pixmap, least recently used first
+        self._rasters = OrderedDict()
+    
+    def page_raster(self, page_num: int, zoom: float):
+        """The whole page rendered once at a zoom, shared by every capture on that page"""
+        import fitz  # PyMuPDF
+        
+        key = (page_num, zoom)
+        if key in self._rasters:
+            self._rasters.move_to_end(key)
+            return self._rasters[key]
+        
+        raster = self.doc[page_num].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        self._rasters[key] = raster
+        if len(self._rasters) > self.PAGE_RASTER_CACHE_SIZE:
+            self._rasters.popitem(last=False)
+        return raster
+    
+    def render_highlighted(
+        self,
+        page_num: int,
+        zoom: float,
+        clip=None,
+        highlight_rects: List = (),
+        highlight_color: Tuple[float, float, float] = (1, 0, 0),
+        highlight_width: float = 3
+    ) -> bytes:
+        """
+        PNG of a page region with field outlines, cut from the cached page raster
         
+        clip and highlight_rects are in page coordinates; clip=None is the whole
+        page. The crop is a pixel copy of the raster and a HighlightCompositor
+        draws the outlines on the copy, so the page is never re-rendered and
+        the PDF is never touched.
+        """
+        import fitz  # PyMuPDF
+        
+        raster = self.page_raster(page_num, zoom)
+        scale = fitz.Matrix(zoom, zoom)
+        window = raster.irect if clip is None else (fitz.Rect(clip) * scale).irect & raster.irect
+        pix = fitz.Pixmap(raster.colorspace, window, raster.alpha)
+        pix.copy(raster, window)
+        
+        # Rects are unrotated page coordinates; the raster is the page as displayed
+        to_raster = self.doc[page_num].rotation_matrix * scale
+        compositor = HighlightCompositor(highlight_color, highlight_width * zoom)
+        compositor.draw(pix, [fitz.Rect(rect) * to_raster for rect in highlight_rects])
+        return pix.tobytes("png")
+    
     def capture_field_context(
         self, 
         field_info: Dict, 
@@ -37,6 +147,8 @@ class PDFVisualContextExtractor:
         Returns:
             Dictionary with screenshot data and metadata
         """
+        import fitz  # PyMuPDF
+        
         page_num = field_info.get('page', 0)
         field_rect = field_info.get('position') or field_info.get('rect')
         
@@ -51,71 +163,29 @@ class PDFVisualContextExtractor:
         if isinstance(field_rect, list):
             field_rect = fitz.Rect(field_rect[0], field_rect[1], field_rect[2], field_rect[3])
         
-        # Create full-width capture rectangle
+        # Create full-width capture rectangle around the field as displayed
+        shown_rect = field_rect * page.rotation_matrix
         capture_rect = fitz.Rect(
             0,  # Full width from left edge
-            max(0, field_rect.y0 - vertical_padding),  # Add padding above
+            max(0, shown_rect.y0 - vertical_padding),  # Add padding above
             page_rect.width,  # Full width to right edge
-            min(page_rect.height, field_rect.y1 + vertical_padding)  # Add padding below
+            min(page_rect.height, shown_rect.y1 + vertical_padding)  # Add padding below
         )
         
-        # Create a copy of the page for drawing
-        # This ensures we don't modify the original PDF
-        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=capture_rect)
-        
-        # Convert to PIL Image for drawing the highlight
-        img_data = pix.tobytes("png")
-        
-        # Create a fresh pixmap without any modifications first
-        clean_pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=capture_rect)
-        
-        # Convert to image and draw the rectangle using PIL or create a new document
-        # We'll use a temporary document approach to avoid modifying the original
-        temp_doc = fitz.open()  # Create empty document
-        temp_page = temp_doc.new_page(width=page_rect.width, height=page_rect.height)
-        
-        # Insert the page content
-        temp_page.show_pdf_page(temp_page.rect, self.doc, page_num)
-        
-        # Now draw the highlight on the temporary page
-        temp_page.draw_rect(
-            field_rect,
-            color=highlight_color,
-            width=highlight_width
-        )
-        
-        # Capture with the highlight
-        highlighted_pix = temp_page.get_pixmap(
-            matrix=fitz.Matrix(zoom, zoom),
-            clip=capture_rect
-        )
-        
-        # Convert to base64 for API transmission
-        img_buffer = io.BytesIO(highlighted_pix.tobytes("png"))
-        img_buffer.seek(0)
-        img_data = img_buffer.read()
+        # Crop the window out of the page raster and outline the field on it
+        highlight = {'highlight_rects': [field_rect], 'highlight_color': highlight_color,
+                     'highlight_width': highlight_width}
+        img_data = self.render_highlighted(page_num, zoom, capture_rect, **highlight)
         
         # Check size and compress if needed (4MB limit for base64)
         if len(img_data) > 3 * 1024 * 1024:  # If larger than 3MB (to leave room for base64 overhead)
-            # Re-render at lower quality
-            highlighted_pix = temp_page.get_pixmap(
-                matrix=fitz.Matrix(1.5, 1.5),  # Lower zoom
-                clip=capture_rect
-            )
-            img_buffer = io.BytesIO(highlighted_pix.tobytes("png"))
-            img_buffer.seek(0)
-            img_data = img_buffer.read()
+            # Crop from a lower zoom raster instead
+            img_data = self.render_highlighted(page_num, 1.5, capture_rect, **highlight)
             
         screenshot_base64 = base64.b64encode(img_data).decode('utf-8')
         
         # Also prepare full page capture with highlight
-        full_page_pix = temp_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
-        full_page_buffer = io.BytesIO(full_page_pix.tobytes("png"))
-        full_page_buffer.seek(0)
-        full_page_base64 = base64.b64encode(full_page_buffer.read()).decode('utf-8')
-        
-        # Clean up temporary document
-        temp_doc.close()
+        full_page_base64 = base64.b64encode(self.render_highlighted(page_num, zoom, **highlight)).decode('utf-8')
         
         return {
             'field_screenshot': screenshot_base64,
@@ -160,6 +230,8 @@ class PDFVisualContextExtractor:
         Returns:
             Dictionary with screenshot data and metadata
         """
+        import fitz  # PyMuPDF
+        
         if not fields_info:
             return None
             
@@ -183,7 +255,7 @@ class PDFVisualContextExtractor:
         page = self.doc[primary_page]
         page_rect = page.rect
         
-        # Collect all field rectangles and find the bounding box
+        # Collect all field rectangles and find the bounding box as displayed
         field_rects = []
         min_y = page_rect.height
         max_y = 0
@@ -195,8 +267,9 @@ class PDFVisualContextExtractor:
                 if isinstance(field_rect, list):
                     field_rect = fitz.Rect(field_rect[0], field_rect[1], field_rect[2], field_rect[3])
                 field_rects.append(field_rect)
-                min_y = min(min_y, field_rect.y0)
-                max_y = max(max_y, field_rect.y1)
+                shown_rect = field_rect * page.rotation_matrix
+                min_y = min(min_y, shown_rect.y0)
+                max_y = max(max_y, shown_rect.y1)
         
         if not field_rects:
             return None
@@ -209,53 +282,22 @@ class PDFVisualContextExtractor:
             min(page_rect.height, max_y + vertical_padding)  # Add padding below bottommost field
         )
         
-        # Create a temporary document to draw highlights
-        temp_doc = fitz.open()  # Create empty document
-        temp_page = temp_doc.new_page(width=page_rect.width, height=page_rect.height)
-        
-        # Insert the page content
-        temp_page.show_pdf_page(temp_page.rect, self.doc, primary_page)
-        
-        # Draw highlights for all fields
-        for field_rect in field_rects:
-            temp_page.draw_rect(
-                field_rect,
-                color=highlight_color,
-                width=highlight_width
-            )
-        
-        # Capture with the highlights
-        highlighted_pix = temp_page.get_pixmap(
-            matrix=fitz.Matrix(zoom, zoom),
-            clip=capture_rect
-        )
-        
-        # Convert to base64 for API transmission
-        img_buffer = io.BytesIO(highlighted_pix.tobytes("png"))
-        img_buffer.seek(0)
-        img_data = img_buffer.read()
+        # Crop the window out of the page raster and outline every field on it
+        highlight = {'highlight_rects': field_rects, 'highlight_color': highlight_color,
+                     'highlight_width': highlight_width}
+        img_data = self.render_highlighted(primary_page, zoom, capture_rect, **highlight)
         
         # Check size and compress if needed (4MB limit for base64)
         if len(img_data) > 3 * 1024 * 1024:  # If larger than 3MB (to leave room for base64 overhead)
-            # Re-render at lower quality
-            highlighted_pix = temp_page.get_pixmap(
-                matrix=fitz.Matrix(1.5, 1.5),  # Lower zoom
-                clip=capture_rect
-            )
-            img_buffer = io.BytesIO(highlighted_pix.tobytes("png"))
-            img_buffer.seek(0)
-            img_data = img_buffer.read()
+            # Crop from a lower zoom raster instead
+            img_data = self.render_highlighted(primary_page, 1.5, capture_rect, **highlight)
             
         screenshot_base64 = base64.b64encode(img_data).decode('utf-8')
         
         # Also prepare full page capture with highlights
-        full_page_pix = temp_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
-        full_page_buffer = io.BytesIO(full_page_pix.tobytes("png"))
-        full_page_buffer.seek(0)
-        full_page_base64 = base64.b64encode(full_page_buffer.read()).decode('utf-8')
-        
-        # Clean up temporary document
-        temp_doc.close()
+        full_page_base64 = base64.b64encode(
+            self.render_highlighted(primary_page, zoom, **highlight)
+        ).decode('utf-8')
         
         # Return data with all field rectangles
         field_rects_data = []
@@ -303,9 +345,12 @@ class PDFVisualContextExtractor:
         Returns:
             List of dictionaries with field info and screenshots
         """
-        results = []
+        results = [None] * len(fields)
         
-        for i, field in enumerate(fields):
+        # Visit fields page by page so each page is rendered once; results keep the input order
+        order = sorted(range(len(fields)), key=lambda i: fields[i].get('page') or 0)
+        for i in order:
+            field = fields[i]
             print(f"Capturing context for field {i+1}/{len(fields)}: {field.get('field_name', 'Unknown')}")
             
             screenshot_data = self.capture_field_context(
@@ -323,7 +368,7 @@ class PDFVisualContextExtractor:
                         f.write(img_data)
                     print(f"  ✓ Saved preview screenshot to: {preview_filename}")
                 
-                results.append({
+                results[i] = {
                     'field': field,
                     'screenshot': screenshot_data['field_screenshot'],
                     'full_page': screenshot_data['full_page_screenshot'],
@@ -333,15 +378,15 @@ class PDFVisualContextExtractor:
                         'page_num': screenshot_data['page_num'],
                         'page_dimensions': screenshot_data['page_dimensions']
                     }
-                })
+                }
             else:
                 print(f"  Warning: Could not capture context for field {field.get('field_name', 'Unknown')}")
-                results.append({
+                results[i] = {
                     'field': field,
                     'screenshot': None,
                     'full_page': None,
                     'metadata': None
-                })
+                }
         
         return results
     
@@ -378,8 +423,10 @@ class PDFVisualContextExtractor:
     
     def close(self):
         """Close the PDF document"""
+        self._rasters.clear()
         if self.doc:
-            self.doc.close()
+            self.session.close()
+            self.doc = None
     
     def __enter__(self):
         return self
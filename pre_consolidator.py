@@ -9,6 +9,7 @@ from collections import defaultdict
 import re
 from dataclasses import dataclass
 import statistics
+from pdf_session import PDFDocumentSession
 
 
 @dataclass
@@ -21,11 +22,15 @@ class FieldGroup:
 
 
 class PreConsolidator:
-    def __init__(self, interactive_mode: bool = False, gui_mode: bool = False, pdf_path: str = None):
+    def __init__(self, interactive_mode: bool = False, gui_mode: bool = False, pdf_path: str = None,
+                 geometry_path: str = None):
         self.interactive_mode = interactive_mode
         self.gui_mode = gui_mode
         self.pdf_path = pdf_path
+        self.geometry_path = geometry_path
         self.document_stats = {}
+        self._session = None
+        self._geometry = None
         
     def pre_consolidate_fields(self, extracted_fields: List[Dict]) -> List[FieldGroup]:
         """
@@ -41,6 +46,30 @@ class PreConsolidator:
         if self.gui_mode:
             return []
         
+        # Page text lines come from the extractor's geometry sidecar, or the PDF itself
+        if self.geometry_path:
+            self._geometry = self._load_geometry(self.geometry_path)
+        if self._geometry is None and self.pdf_path:
+            self._session = PDFDocumentSession(self.pdf_path)
+        
+        try:
+            return self._pre_consolidate_fields(extracted_fields)
+        finally:
+            self._geometry = None
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+    
+    def _load_geometry(self, geometry_path: str):
+        """Memory-map a page geometry sidecar, or return None if it cannot be used"""
+        try:
+            from page_geometry import PageGeometry
+            return PageGeometry.load(geometry_path)
+        except Exception as e:
+            print(f"Error loading page geometry: {e}")
+            return None
+    
+    def _pre_consolidate_fields(self, extracted_fields: List[Dict]) -> List[FieldGroup]:
         # Calculate document statistics for adaptive thresholds
         self._calculate_document_stats(extracted_fields)
         
@@ -52,23 +81,27 @@ class PreConsolidator:
         radio_groups = self._group_radio_buttons(extracted_fields, grouped_fields)
         field_groups.extend(radio_groups)
         
-        # 2. Group checkboxes with smart proximity and pattern detection
+        # 2. Group widgets of one field that appears several times (linked by the extractor)
+        linked_groups = self._group_linked_widgets(extracted_fields, grouped_fields)
+        field_groups.extend(linked_groups)
+        
+        # 3. Group checkboxes with smart proximity and pattern detection
         checkbox_groups = self._group_checkboxes(extracted_fields, grouped_fields)
         field_groups.extend(checkbox_groups)
         
-        # 3. Group text continuations
+        # 4. Group text continuations
         continuation_groups = self._group_text_continuations(extracted_fields, grouped_fields)
         field_groups.extend(continuation_groups)
         
-        # 4. Group linked signature/date fields
+        # 5. Group linked signature/date fields
         linked_date_groups = self._group_linked_dates(extracted_fields, grouped_fields)
         field_groups.extend(linked_date_groups)
         
-        # 5. Group same-value fields (fields that appear on multiple pages)
+        # 6. Group same-value fields (fields that appear on multiple pages)
         same_value_groups = self._group_same_value_fields(extracted_fields, grouped_fields)
         field_groups.extend(same_value_groups)
         
-        # 6. Create individual groups for remaining fields
+        # 7. Create individual groups for remaining fields
         for field in extracted_fields:
             if field['field_name'] not in grouped_fields:
                 field_groups.append(FieldGroup(
@@ -80,6 +113,28 @@ class PreConsolidator:
         
         return field_groups
     
+    def _field_label(self, field: Dict) -> str:
+        """Label text for a field: a page text line, its context, or its reading-order predecessor"""
+        if self._geometry is not None and field.get('page') is not None and field.get('position'):
+            model = self._geometry.text_model(field['page'])
+            if model is not None:
+                return model.label_for(field['position'])
+        
+        if self._session is not None and field.get('page') is not None and field.get('position'):
+            try:
+                model = self._session.text_model(field['page'])
+                if model is not None:
+                    return model.label_for(field['position'])
+            except Exception as e:
+                print(f"Error reading page text: {e}")
+                self._session.close()
+                self._session = None
+        
+        # The reading-order predecessor is a single text run, which may not be the
+        # "(a)" marker beside the field, so it only stands in when there is no context
+        label = field.get('context_left', '') + field.get('context_above', '')
+        return label or field.get('reading_prev_text') or ''
+    
     def _calculate_document_stats(self, fields: List[Dict]):
         """Calculate document-wide statistics for adaptive thresholds"""
         # Calculate average vertical spacing between fields
@@ -125,6 +180,27 @@ class PreConsolidator:
         
         return groups
     
+    def _group_linked_widgets(self, fields: List[Dict], grouped: Set[str]) -> List[FieldGroup]:
+        """Group the widgets of multi-widget fields, which the extractor tags with linked_widget_index"""
+        linked = defaultdict(list)
+        
+        for field in fields:
+            if field.get('linked_widget_count', 1) > 1 and field['field_name'] not in grouped:
+                linked[field['field_name']].append(field)
+        
+        groups = []
+        for field_name, widgets in linked.items():
+            pages = sorted(set(w.get('page') for w in widgets if w.get('page') is not None))
+            groups.append(FieldGroup(
+                group_type='same_value',
+                fields=widgets,
+                confidence=1.0,
+                reason=f'One field ({field_name}) with {len(widgets)} widgets on pages {pages}'
+            ))
+            grouped.add(field_name)
+        
+        return groups
+    
     def _group_checkboxes(self, fields: List[Dict], grouped: Set[str]) -> List[FieldGroup]:
         """Group checkboxes using advanced proximity and pattern detection"""
         checkbox_fields = []
@@ -256,8 +332,8 @@ class PreConsolidator:
                     has_section_break = False
                     
                     # Check if there's a label like (a), (b) in context
-                    prev_context = cbs[i-1].get('context_left', '') + cbs[i-1].get('context_above', '')
-                    curr_context = cbs[i].get('context_left', '') + cbs[i].get('context_above', '')
+                    prev_context = self._field_label(cbs[i-1])
+                    curr_context = self._field_label(cbs[i])
                     
                     if (re.search(r'\([a-z]\)', prev_context) and re.search(r'\([a-z]\)', curr_context)):
                         # Different section labels
@@ -1028,45 +1104,71 @@ class PreConsolidator:
 
 
 def main():
-    """Test the pre-consolidator"""
+    """Pre-consolidate an extraction output, or the built-in test fields"""
+    import argparse
     import json
+    from pathlib import Path
     
-    # Example test data
-    test_fields = [
-        {
-            'field_name': 'checkbox_1',
-            'field_type': 'CheckBox',
-            'page': 0,
-            'position': [100, 100, 120, 120]
-        },
-        {
-            'field_name': 'checkbox_2',
-            'field_type': 'CheckBox',
-            'page': 0,
-            'position': [100, 130, 120, 150]
-        },
-        {
-            'field_name': 'checkbox_3',
-            'field_type': 'CheckBox',
-            'page': 0,
-            'position': [100, 160, 120, 180]
-        },
-        {
-            'field_name': 'signature_1',
-            'field_type': 'Signature',
-            'page': 1,
-            'position': [100, 500, 300, 550]
-        },
-        {
-            'field_name': 'date_1',
-            'field_type': 'Text',
-            'page': 1,
-            'position': [320, 510, 420, 530]
-        }
-    ]
+    parser = argparse.ArgumentParser(description='Group related fields of an extraction output')
+    parser.add_argument('fields_file', nargs='?',
+                        help='Output of extract_pdf_fields_enhanced.py (.json or .jsonl); test fields if omitted')
+    parser.add_argument('--pdf', help='Source PDF, read for checkbox labels when there is no geometry sidecar')
+    args = parser.parse_args()
     
-    consolidator = PreConsolidator(interactive_mode=False)
-    groups = consolidator.pre_consolidate_fields(test_fields)
+    if args.fields_file:
+        with open(args.fields_file, 'r', encoding='utf-8') as f:
+            if args.fields_file.endswith('.jsonl'):
+                fields = [json.loads(line) for line in f if line.strip()]
+            else:
+                fields = json.load(f)
+        
+        # The extractor's sidecar stands in for the PDF when it is there (it needs NumPy)
+        try:
+            from page_geometry import GEOMETRY_SUFFIX
+            geometry_path = args.fields_file + GEOMETRY_SUFFIX
+        except ImportError:
+            geometry_path = None
+        if geometry_path and not Path(geometry_path).exists():
+            geometry_path = None
+        consolidator = PreConsolidator(interactive_mode=False, pdf_path=args.pdf, geometry_path=geometry_path)
+        groups = consolidator.pre_consolidate_fields(fields)
+    else:
+        # Example test data
+        test_fields = [
+            {
+                'field_name': 'checkbox_1',
+                'field_type': 'CheckBox',
+                'page': 0,
+                'position': [100, 100, 120, 120]
+            },
+            {
+                'field_name': 'checkbox_2',
+                'field_type': 'CheckBox',
+                'page': 0,
+                'position': [100, 130, 120, 150]
+            },
+            {
+                'field_name': 'checkbox_3',
+                'field_type': 'CheckBox',
+                'page': 0,
+                'position': [100, 160, 120, 180]
+            },
+            {
+                'field_name': 'signature_1',
+                'field_type': 'Signature',
+                'page': 1,
+                'position': [100, 500, 300, 550]
+            },
+            {
+                'field_name': 'date_1',
+                'field_type': 'Text',
+                'page': 1,
+                'position': [320, 510, 420, 530]
+            }
+        ]
+        
+        consolidator = PreConsolidator(interactive_mode=False)
+        groups = consolidator.pre_consolidate_fields(test_fields)
     
     print("Pre-consolidation Results:")
     print("="*60)
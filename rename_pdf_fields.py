@@ -9,7 +9,6 @@ import sys
 import os
 from pathlib import Path
 from typing import Dict, List, Optional
-import fitz  # PyMuPDF
 import shutil
 from datetime import datetime
 
@@ -121,6 +120,8 @@ class PDFFieldRenamer:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_path = Path(self.pdf_path).stem + f"_renamed_{timestamp}.pdf"
         
+        import fitz  # PyMuPDF
+        
         try:
             # Open PDF
             pdf_doc = fitz.open(self.pdf_path)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Section Outline
+Finds section headings on a page ("5. SECURITY DEPOSIT", "ARTICLE II", bold or
+enlarged capitals) from the font size, weight and numbering of its text lines,
+and looks up the section path enclosing any field
+"""
+
+import re
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+# Headings are short; longer lines only count when a short numbered title leads them
+MAX_HEADING_LENGTH = 80
+
+# Lines this much larger than the page's body text are set as headings
+LARGE_FONT_RATIO = 1.15
+
+# Section numbering: "5.", "5.1", "5.1.2", "ARTICLE II", "Section 3", "IV.", "B."
+NUMBERING = re.compile(
+    r'^(?:(?:article|section|part)\s+(?P<word>\d+|[ivxlc]+)\b'
+    r'|(?P<number>\d{1,3}(?:\.\d{1,3})*)(?:\.|\))?(?=\s|$)'
+    r'|(?P<roman>[IVXLC]{1,6})\.(?=\s)'
+    r'|(?P<letter>[A-Z])\.(?=\s))',
+    re.IGNORECASE
+)
+
+# Font names of bold weights
+BOLD_FONT = re.compile(r'bold|black|heavy|semibold|demi', re.IGNORECASE)
+
+
+def numbering_depth(text: str) -> Optional[int]:
+    """Nesting depth of a heading's section number (1 for "5.", 2 for "5.1"), or None if unnumbered"""
+    match = NUMBERING.match(text)
+    if not match:
+        return None
+    if match.group('number'):
+        # A bare number like "2024" or "100" is more likely a value than a section
+        if '.' not in match.group(0) and ')' not in match.group(0) and len(match.group('number')) > 2:
+            return None
+        return match.group('number').count('.') + 1
+    if match.group('letter'):
+        return 2
+    return 1
+
+
+def heading_text(text: str) -> Optional[str]:
+    """The heading part of a line, cutting a run-in heading ("5. RENT: Tenant shall...") at its colon"""
+    text = text.strip()
+    if len(text) > MAX_HEADING_LENGTH:
+        head = text.split(':', 1)[0].strip()
+        if len(head) == len(text) or len(head) > MAX_HEADING_LENGTH:
+            return None
+        text = head
+    return text.rstrip(':').strip() or None
+
+
+def _is_caps(text: str) -> bool:
+    letters = [c for c in text if c.isalpha()]
+    return len(letters) >= 3 and sum(c.isupper() for c in letters) >= 0.8 * len(letters)
+
+
+def body_size(lines: List[Dict]) -> float:
+    """Most common font size on the page, weighted by text length"""
+    sizes = Counter()
+    for line in lines:
+        sizes[round(line.get('size', 0) * 2) / 2] += len(line['text'])
+    return sizes.most_common(1)[0][0] if sizes else 0
+
+
+def page_outline(lines: List[Dict]) -> List[Dict]:
+    """
+    Section headings of one page, top to bottom, each with the path of
+    headings it sits under
+
+    A line is a heading when it is numbered and set bold, large or in
+    capitals; when it is set clearly larger than the page's body text; or
+    when it is bold capitals. Field labels ending in a colon, fill-in lines
+    and lines without letters are skipped. Nesting comes from font size
+    tiers first, larger being higher, then from the depth of the numbering.
+    """
+    base = body_size(lines)
+    candidates = []
+    for line in lines:
+        raw = line['text'].strip()
+        if not raw or '__' in raw or (raw.endswith(':') and len(raw) <= MAX_HEADING_LENGTH):
+            continue
+        text = heading_text(raw)
+        if not text or not any(c.isalpha() for c in text):
+            continue
+
+        size = round(line.get('size', 0) * 2) / 2
+        bold = bool(BOLD_FONT.search(line.get('fontname', '') or ''))
+        large = base > 0 and size >= base * LARGE_FONT_RATIO
+        caps = _is_caps(text)
+        depth = numbering_depth(text)
+
+        if (depth is not None and (bold or large or caps)) or (large and len(raw) <= MAX_HEADING_LENGTH) or \
+                (bold and caps):
+            candidates.append((line, text, size, depth or 0))
+
+    # Size tiers: the largest heading size is tier 0
+    tiers = {size: tier for tier, size in enumerate(sorted({c[2] for c in candidates}, reverse=True))}
+
+    outline = []
+    stack = []
+    for line, text, size, depth in candidates:
+        level = (tiers[size], depth)
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, text))
+        outline.append({
+            'text': text,
+            'y0': line['y0'],
+            'level': len(stack),
+            'path': [heading for _, heading in stack]
+        })
+    return outline
+
+
+def section_paths(outline: List[Dict], rects: List[List[float]]) -> List[List[str]]:
+    """Path of the last heading starting above each rect's vertical center, by bisecting the outline"""
+    tops = [heading['y0'] for heading in outline]
+    paths = []
+    for rect in rects:
+        index = bisect_right(tops, (rect[1] + rect[3]) / 2) - 1
+        paths.append(list(outline[index]['path']) if index >= 0 else [])
+    return paths
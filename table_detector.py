@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Table Detector
+Finds grids of form widgets on a page (checklists, inventory-and-condition
+tables) from widget alignment and ruling lines, and labels every cell with
+its row and column headers
+"""
+
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+
+# Widgets whose vertical centers differ by less than this share a row
+ROW_TOLERANCE = 4
+
+# Widget centers closer than this horizontally share a column
+COLUMN_TOLERANCE = 12
+
+# Consecutive rows further apart than this many row heights start a new table
+MAX_ROW_GAP = 3
+
+# Drawn lines shorter than this are not rulings; filled rects thinner than
+# RULE_THICKNESS are treated as lines
+MIN_RULE_LENGTH = 8
+RULE_THICKNESS = 3
+
+# How far above the first row to look for column headers when no ruling bounds them
+HEADER_DISTANCE = 30
+
+
+def ruling_lines(drawings: List[Dict]) -> Tuple[List[Tuple[float, float, float]], List[Tuple[float, float, float]]]:
+    """
+    Horizontal (y, x0, x1) and vertical (x, y0, y1) rulings from page.get_drawings()
+
+    Straight line items and thin rectangles become one ruling each; larger
+    rectangles, such as stroked cell borders, contribute their four edges.
+    """
+    horizontal = []
+    vertical = []
+
+    def add_line(x0, y0, x1, y1):
+        if abs(y1 - y0) <= RULE_THICKNESS and abs(x1 - x0) >= MIN_RULE_LENGTH:
+            horizontal.append(((y0 + y1) / 2, min(x0, x1), max(x0, x1)))
+        elif abs(x1 - x0) <= RULE_THICKNESS and abs(y1 - y0) >= MIN_RULE_LENGTH:
+            vertical.append(((x0 + x1) / 2, min(y0, y1), max(y0, y1)))
+
+    for path in drawings:
+        for item in path.get('items', []):
+            if item[0] == 'l':
+                add_line(item[1].x, item[1].y, item[2].x, item[2].y)
+            elif item[0] == 're':
+                rect = item[1]
+                if rect.height <= RULE_THICKNESS:
+                    add_line(rect.x0, (rect.y0 + rect.y1) / 2, rect.x1, (rect.y0 + rect.y1) / 2)
+                elif rect.width <= RULE_THICKNESS:
+                    add_line((rect.x0 + rect.x1) / 2, rect.y0, (rect.x0 + rect.x1) / 2, rect.y1)
+                else:
+                    add_line(rect.x0, rect.y0, rect.x1, rect.y0)
+                    add_line(rect.x0, rect.y1, rect.x1, rect.y1)
+                    add_line(rect.x0, rect.y0, rect.x0, rect.y1)
+                    add_line(rect.x1, rect.y0, rect.x1, rect.y1)
+
+    horizontal.sort()
+    vertical.sort()
+    return horizontal, vertical
+
+
+def _cluster(values: List[float], tolerance: float) -> List[float]:
+    """Sorted cluster centers of 1-D values, splitting wherever the gap exceeds tolerance"""
+    clusters = []
+    for value in sorted(values):
+        if clusters and value - clusters[-1][-1] <= tolerance:
+            clusters[-1].append(value)
+        else:
+            clusters.append([value])
+    return [sum(cluster) / len(cluster) for cluster in clusters]
+
+
+def _nearest_rule(rules: List[Tuple[float, float, float]], position: float, lo: float, hi: float,
+                  limit: float, above: bool) -> Optional[float]:
+    """
+    Closest ruling at or before (above=True) or at or after position, within
+    limit, that overlaps the span [lo, hi] along its length
+    """
+    best = None
+    for coordinate, start, end in rules:
+        if end < lo or start > hi:
+            continue
+        distance = position - coordinate if above else coordinate - position
+        if -ROW_TOLERANCE <= distance <= limit and (best is None or distance < best[0]):
+            best = (distance, coordinate)
+    return best[1] if best else None
+
+
+def _text_in(words: List[Dict], x0: float, y0: float, x1: float, y1: float) -> str:
+    """Words whose centers fall inside a box, in the page's word order"""
+    return ' '.join(
+        w['text'] for w in words
+        if x0 <= (w['x0'] + w['x1']) / 2 <= x1 and y0 <= (w['y0'] + w['y1']) / 2 <= y1
+    ).strip()
+
+
+def detect_tables(widget_rects: List[List[float]], words: List[Dict],
+                  drawings: Optional[List[Dict]] = None) -> List[Optional[Dict]]:
+    """
+    Assign every widget on a page to a table cell in one pass
+
+    Widgets are grouped into rows by vertical center; consecutive rows that
+    share at least two column positions form a table. Rulings, when the page
+    has them, bound each row and column so headers are read from the right
+    cells; otherwise the bands halfway between neighboring rows and columns
+    are used. Returns, per widget, a dict with the page-local table index,
+    row and column indices and their labels, or None for widgets outside
+    any table.
+    """
+    horizontal, vertical = ruling_lines(drawings or [])
+    assignments = [None] * len(widget_rects)
+
+    # Rows: widgets sorted by center y, split where the center jumps
+    order = sorted(range(len(widget_rects)), key=lambda i: (widget_rects[i][1] + widget_rects[i][3]) / 2)
+    rows = []
+    for i in order:
+        center_y = (widget_rects[i][1] + widget_rects[i][3]) / 2
+        if rows and center_y - rows[-1]['center'] < ROW_TOLERANCE:
+            rows[-1]['widgets'].append(i)
+        else:
+            rows.append({'center': center_y, 'widgets': [i]})
+
+    for row in rows:
+        row['top'] = min(widget_rects[i][1] for i in row['widgets'])
+        row['bottom'] = max(widget_rects[i][3] for i in row['widgets'])
+        row['columns'] = _cluster([(widget_rects[i][0] + widget_rects[i][2]) / 2 for i in row['widgets']],
+                                  COLUMN_TOLERANCE)
+
+    def shared_columns(a, b):
+        return sum(1 for x in a['columns'] if any(abs(x - y) <= COLUMN_TOLERANCE for y in b['columns']))
+
+    # Tables: runs of neighboring rows with at least two columns in common
+    tables = []
+    for row in rows:
+        if len(row['columns']) < 2:
+            continue
+        if tables:
+            last = tables[-1][-1]
+            height = max(last['bottom'] - last['top'], row['bottom'] - row['top'], 1)
+            if row['top'] - last['bottom'] <= MAX_ROW_GAP * height and shared_columns(last, row) >= 2:
+                tables[-1].append(row)
+                continue
+        tables.append([row])
+    tables = [table_rows for table_rows in tables if len(table_rows) >= 2]
+
+    for table_index, table_rows in enumerate(tables):
+        members = [i for row in table_rows for i in row['widgets']]
+        columns = _cluster([(widget_rects[i][0] + widget_rects[i][2]) / 2 for i in members], COLUMN_TOLERANCE)
+        column_lefts = [min(widget_rects[i][0] for i in members
+                            if abs((widget_rects[i][0] + widget_rects[i][2]) / 2 - x) <= COLUMN_TOLERANCE)
+                        for x in columns]
+        column_rights = [max(widget_rects[i][2] for i in members
+                             if abs((widget_rects[i][0] + widget_rects[i][2]) / 2 - x) <= COLUMN_TOLERANCE)
+                         for x in columns]
+        table_x0, table_x1 = column_lefts[0], column_rights[-1]
+
+        # Column bands: between vertical rulings, else halfway to the neighboring column
+        column_bands = []
+        for c in range(len(columns)):
+            left = _nearest_rule(vertical, column_lefts[c], table_rows[0]['top'], table_rows[-1]['bottom'],
+                                 column_lefts[c] - column_rights[c - 1] if c else column_rights[c] - column_lefts[c],
+                                 above=True)
+            right = _nearest_rule(vertical, column_rights[c], table_rows[0]['top'], table_rows[-1]['bottom'],
+                                  (column_lefts[c + 1] if c + 1 < len(columns) else column_rights[c] + 100)
+                                  - column_rights[c], above=False)
+            if left is None:
+                left = (column_rights[c - 1] + column_lefts[c]) / 2 if c else \
+                    column_lefts[c] - (column_rights[c] - column_lefts[c]) / 2
+            if right is None:
+                right = (column_rights[c] + column_lefts[c + 1]) / 2 if c + 1 < len(columns) else \
+                    column_rights[c] + (column_rights[c] - column_lefts[c]) / 2
+            column_bands.append((left, right))
+
+        # Row bands: between horizontal rulings, else halfway to the neighboring row
+        row_bands = []
+        for r, row in enumerate(table_rows):
+            pitch = row['bottom'] - row['top'] + ROW_TOLERANCE
+            top = _nearest_rule(horizontal, row['top'], table_x0, table_x1, pitch, above=True)
+            bottom = _nearest_rule(horizontal, row['bottom'], table_x0, table_x1, pitch, above=False)
+            if top is None:
+                top = (table_rows[r - 1]['bottom'] + row['top']) / 2 if r else row['top'] - pitch / 2
+            if bottom is None:
+                bottom = (row['bottom'] + table_rows[r + 1]['top']) / 2 if r + 1 < len(table_rows) else \
+                    row['bottom'] + pitch / 2
+            row_bands.append((top, bottom))
+
+        # Row headers sit left of the first column: back to the next ruling, or the margin
+        first_left = column_bands[0][0]
+        header_left = _nearest_rule(vertical, first_left - ROW_TOLERANCE - 1, table_rows[0]['top'],
+                                    table_rows[-1]['bottom'], first_left, above=True)
+        header_left = 0 if header_left is None else header_left
+        row_labels = [_text_in(words, header_left, top, first_left, bottom) for top, bottom in row_bands]
+
+        # Column headers sit above the first row: up to the next ruling, or HEADER_DISTANCE
+        first_top = row_bands[0][0]
+        header_top = _nearest_rule(horizontal, first_top - ROW_TOLERANCE - 1, table_x0, table_x1,
+                                   HEADER_DISTANCE * 2, above=True)
+        header_top = first_top - HEADER_DISTANCE if header_top is None else header_top
+        column_labels = [_text_in(words, left, header_top, right, first_top) for left, right in column_bands]
+
+        column_lefts_sorted = [band[0] for band in column_bands]
+        for r, row in enumerate(table_rows):
+            for i in row['widgets']:
+                center_x = (widget_rects[i][0] + widget_rects[i][2]) / 2
+                c = max(0, bisect_left(column_lefts_sorted, center_x) - 1)
+                assignments[i] = {
+                    'table': table_index,
+                    'row': r,
+                    'column': c,
+                    'row_label': row_labels[r],
+                    'column_label': column_labels[c]
+                }
+
+    return assignments
+
+
+def table_grids(records: List[Dict]) -> Dict[Tuple[int, int], Dict[str, Dict[str, Dict]]]:
+    """
+    Group extraction output records that carry table keys into grids
+
+    Returns (page, table) -> row label -> column label -> record, so a whole
+    checklist can be read by its printed headers instead of by field names.
+    """
+    grids = {}
+    for record in records:
+        if record.get('table') is None:
+            continue
+        grid = grids.setdefault((record['page'], record['table']), {})
+        grid.setdefault(record['table_row_label'], {})[record['table_column_label']] = record
+    return grids